@@ -0,0 +1,335 @@
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    copy_checkpoint,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.types import ChannelProtocol
+from langchain_core.runnables import RunnableConfig
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+from collections import Counter, OrderedDict
+import asyncio
+import logging
+import queue
+import threading
+
+
+class CheckpointWriteError(Exception):
+    """
+    Raised on the next access to a thread whose checkpoints failed to be written in the background.
+    """
+
+
+class WriteBehindSaver(BaseCheckpointSaver):
+    """
+    Wraps a checkpoint saver, serving the latest checkpoint of each thread from memory and writing checkpoints
+    to the wrapped saver from a background thread.
+
+    The writer takes up to `batch_size` queued operations at a time and only writes the latest checkpoint of each
+    thread/namespace in the batch, along with its writes, so a run that checkpoints every step writes once per batch.
+    At most `max_queue` operations are queued, when the writer falls that far behind `put` blocks and `aput` waits
+    for a free slot in a worker thread, so the event loop keeps running.
+
+    Reads of an older checkpoint, and `list`, wait for the queued writes of the thread first so they see everything
+    this process has written. The cache assumes a thread is only written by this process, with several API replicas
+    route a thread to the same replica or use the wrapped saver directly. A failed write is raised as a
+    `CheckpointWriteError` on the next read or write of its thread, which then reads from the wrapped saver again.
+
+    Call `flush` / `aflush` to wait for the queued writes, e.g. at the end of a request and on shutdown.
+    Other attributes, like the retention methods, are forwarded to the wrapped saver.
+    """
+
+    def __init__(
+        self,
+        saver: BaseCheckpointSaver,
+        max_threads: int = 1000,
+        max_queue: int = 10000,
+        batch_size: int = 100,
+    ) -> None:
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.max_threads = max_threads
+        self.batch_size = batch_size
+        # (thread_id, checkpoint_ns) -> latest checkpoint tuple, in least to most recently used order
+        self._latest: OrderedDict[Tuple[str, str], CheckpointTuple] = OrderedDict()
+        self._lock = threading.Lock()
+        # Notified when queued operations have been written
+        self._written = threading.Condition(self._lock)
+        # thread_id -> number of queued operations, and the error of its last failed write
+        self._pending: Counter = Counter()
+        self._errors: Dict[str, Exception] = {}
+        # One slot per queued operation, taken before enqueueing and released once written, so the queue itself
+        # never blocks and operations are enqueued under `_lock` in the order they update the cache
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._queue: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="checkpoint-writer", daemon=True)
+        self._writer.start()
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "saver":
+            raise AttributeError(name)
+        return getattr(self.saver, name)
+
+    def get_next_version(self, current: Optional[Any], channel: ChannelProtocol) -> Any:
+        return self.saver.get_next_version(current, channel)
+
+    async def _aacquire_slot(self):
+        if self._slots.acquire(blocking=False):
+            return
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self._slots.acquire))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The worker thread still takes the slot, give it back
+            acquiring.add_done_callback(lambda _: self._slots.release())
+            raise
+
+    def _enqueue(self, thread_id: str, method: str, args: tuple):
+        # Called with `_lock` held and a slot taken
+        self._pending[thread_id] += 1
+        self._queue.put_nowait((thread_id, method, args))
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            operations: Dict[str, List[Tuple[str, tuple]]] = {}
+            for thread_id, method, args in batch:
+                operations.setdefault(thread_id, []).append((method, args))
+            for thread_id, thread_operations in operations.items():
+                try:
+                    for method, args in self._coalesce(thread_operations):
+                        getattr(self.saver, method)(*args)
+                    error = None
+                except Exception as e:
+                    logging.error(f"Failed to write checkpoint of thread {thread_id} in the background: {e}")
+                    error = e
+                with self._lock:
+                    if error is not None:
+                        self._errors[thread_id] = error
+                    self._pending[thread_id] -= len(thread_operations)
+                    if not self._pending[thread_id]:
+                        del self._pending[thread_id]
+                    self._written.notify_all()
+            for _ in batch:
+                self._queue.task_done()
+                self._slots.release()
+
+    @staticmethod
+    def _coalesce(operations: List[Tuple[str, tuple]]) -> List[Tuple[str, tuple]]:
+        """
+        Reduce the queued operations of a thread to the latest checkpoint of each namespace and the writes
+        of the checkpoints that are kept.
+
+        The kept checkpoint is put with the config of the first one, so its parent is the last checkpoint written,
+        and with the channel versions that changed in any of them, so savers writing only the changed channels
+        still write every channel that changed since that parent.
+        """
+        puts: Dict[str, tuple] = {}
+        skipped = set()
+        for method, args in operations:
+            if method == "put":
+                config, checkpoint, metadata, new_versions = args
+                checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+                if checkpoint_ns in puts:
+                    first_config, previous, _, previous_versions = puts[checkpoint_ns]
+                    skipped.add(previous["id"])
+                    args = (first_config, checkpoint, metadata, {**previous_versions, **new_versions})
+                puts[checkpoint_ns] = args
+        return [("put", args) for args in puts.values()] + [
+            (method, args)
+            for method, args in operations
+            if method == "put_writes" and args[0]["configurable"]["checkpoint_id"] not in skipped
+        ]
+
+    def _raise_write_error(self, thread_id: str):
+        with self._lock:
+            error = self._errors.pop(thread_id, None)
+            if error is None:
+                return
+            # The cache may be ahead of the wrapped saver, read the thread from it again
+            for key in [key for key in self._latest if key[0] == thread_id]:
+                del self._latest[key]
+        raise CheckpointWriteError(f"Failed to write the checkpoints of thread {thread_id}: {error}") from error
+
+    def flush(self, thread_id: Optional[str] = None) -> None:
+        """
+        Block until every queued checkpoint and write of `thread_id`, or of every thread, has been written
+        to the wrapped saver.
+        """
+        with self._written:
+            if thread_id is None:
+                self._written.wait_for(lambda: not self._pending)
+            else:
+                self._written.wait_for(lambda: str(thread_id) not in self._pending)
+
+    async def aflush(self, thread_id: Optional[str] = None) -> None:
+        with self._lock:
+            pending = bool(self._pending) if thread_id is None else str(thread_id) in self._pending
+        if pending:
+            await asyncio.to_thread(self.flush, thread_id)
+
+    @staticmethod
+    def _thread_key(config: RunnableConfig) -> Tuple[str, str]:
+        return str(config["configurable"]["thread_id"]), config["configurable"].get("checkpoint_ns", "")
+
+    def _cached(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            saved = self._latest.get(self._thread_key(config))
+            if saved is None or (checkpoint_id and checkpoint_id != saved.checkpoint["id"]):
+                return None
+            self._latest.move_to_end(self._thread_key(config))
+            return CheckpointTuple(
+                saved.config,
+                copy_checkpoint(saved.checkpoint),
+                saved.metadata,
+                saved.parent_config,
+                list(saved.pending_writes),
+            )
+
+    def _cache(self, config: RunnableConfig, saved: Optional[CheckpointTuple]):
+        if saved is None or get_checkpoint_id(config):
+            return
+        with self._lock:
+            # A checkpoint put while this one was being read is newer, keep it
+            if self._thread_key(config) not in self._latest:
+                self._latest[self._thread_key(config)] = saved._replace(pending_writes=list(saved.pending_writes or []))
+                self._evict()
+
+    def _evict(self):
+        if len(self._latest) > self.max_threads:
+            self._latest.popitem(last=False)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        self._raise_write_error(self._thread_key(config)[0])
+        if saved := self._cached(config):
+            return saved
+        self.flush(self._thread_key(config)[0])
+        saved = self.saver.get_tuple(config)
+        self._cache(config, saved)
+        return saved
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        self._raise_write_error(self._thread_key(config)[0])
+        if saved := self._cached(config):
+            return saved
+        await self.aflush(self._thread_key(config)[0])
+        saved = await self.saver.aget_tuple(config)
+        self._cache(config, saved)
+        return saved
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        self.flush(self._thread_key(config)[0] if config else None)
+        yield from self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        await self.aflush(self._thread_key(config)[0] if config else None)
+        async for saved in self.saver.alist(config, filter=filter, before=before, limit=limit):
+            yield saved
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        self._raise_write_error(self._thread_key(config)[0])
+        self._slots.acquire()
+        return self._put(config, checkpoint, metadata, new_versions)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        self._raise_write_error(self._thread_key(config)[0])
+        await self._aacquire_slot()
+        return self._put(config, checkpoint, metadata, new_versions)
+
+    def _put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id, checkpoint_ns = self._thread_key(config)
+        next_config = {
+            "configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}
+        }
+        checkpoint = copy_checkpoint(checkpoint)
+        saved = CheckpointTuple(
+            next_config,
+            checkpoint,
+            metadata,
+            (
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": config["configurable"]["checkpoint_id"],
+                    }
+                }
+                if config["configurable"].get("checkpoint_id")
+                else None
+            ),
+            [],
+        )
+        with self._lock:
+            self._latest[(thread_id, checkpoint_ns)] = saved
+            self._latest.move_to_end((thread_id, checkpoint_ns))
+            self._evict()
+            self._enqueue(thread_id, "put", (config, checkpoint, metadata, new_versions))
+        return next_config
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        self._raise_write_error(self._thread_key(config)[0])
+        self._slots.acquire()
+        self._put_writes(config, writes, task_id)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        self._raise_write_error(self._thread_key(config)[0])
+        await self._aacquire_slot()
+        self._put_writes(config, writes, task_id)
+
+    def _put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        with self._lock:
+            saved = self._latest.get(self._thread_key(config))
+            if saved is not None and saved.checkpoint["id"] == config["configurable"]["checkpoint_id"]:
+                # Replace rather than duplicate the writes of a task that is written again
+                saved.pending_writes[:] = [write for write in saved.pending_writes if write[0] != task_id]
+                saved.pending_writes.extend((task_id, channel, value) for channel, value in writes)
+            self._enqueue(self._thread_key(config)[0], "put_writes", (config, writes, task_id))
+
+    def delete_thread(self, thread_id: str) -> int:
+        self.flush(thread_id)
+        with self._lock:
+            self._errors.pop(str(thread_id), None)
+            for key in [key for key in self._latest if key[0] == str(thread_id)]:
+                del self._latest[key]
+        return self.saver.delete_thread(thread_id)
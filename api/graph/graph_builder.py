@@ -1,16 +1,26 @@
-import os, json
-from typing import Annotated, Union
+import os, json, time
+import asyncio
+from typing import Annotated, Any, Optional, Union
 from typing_extensions import TypedDict
 from langgraph.graph import START, END, StateGraph
-from schema.agent_outputs import Action, Finish, Observation, Error, ToolOutput
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from schema.agent_outputs import Action, MultiAction, Finish, Observation, Error, ToolOutput
 from schema.message import Message
 from .reducers import add_clear, add_max_10
 from llm_utils.prompts import Prompts
-from llm_utils.output_parsers import react_parser, plan_parser, observation_parser
-from tools.tools import get_tools
+from llm_utils.models import ROLES, ModelConfig, ModelLimits, build_llm, get_model_configs
+from llm_utils.prompt_caching import PromptCacheUsage, with_prompt_caching
+from llm_utils.output_parsers import ActionStreamParser, react_parser, plan_parser, observation_parser
+from tools.tools import get_tools, get_tool_timeouts
 from langchain_anthropic import ChatAnthropic
 from langchain_openai import ChatOpenAI
-from .utils import get_checkpointer, render_graph, send_event
+from .utils import get_checkpointer, render_graph, send_event, asend_event
+from .observer_policy import ObserverPolicy
+from .plan_cache import TRIVIAL_PLAN, PlanCache, is_trivial_input
+from metrics.metrics import get_metrics
+from .speculation import SpeculativeToolCall, SpeculativeToolCalls, areport_tool_run, get_speculative_tools
 from llm_utils.stop_sequences import STOP_SEQUENCES
 
 
@@ -18,48 +28,87 @@ class State(TypedDict):
     input: str
     output: str
     messages: Annotated[list[Message], add_max_10]
-    steps: Annotated[list[Union[Action, ToolOutput, Observation, Finish, Error]], add_clear]
+    steps: Annotated[list[Union[Action, MultiAction, ToolOutput, Observation, Finish, Error]], add_clear]
     plan: str
+    iterations: int
+    scratchpad: Annotated[list[str], add_clear]
 
 
 class GraphBuilder:
 
-    def __init__(self, llm: Union[ChatAnthropic, ChatOpenAI], verbose=True, max_iterations=10):
-        self.tools = get_tools()
-        self.agent_runnable = (
-            Prompts.ReAct.partial(tools=self.tools.json, tool_names=self.tools.names)
-            | llm.bind(stop=STOP_SEQUENCES).with_config({"tags": ["agent"]})
-            | react_parser
-        )
+    def __init__(
+        self,
+        llm: Union[ChatAnthropic, ChatOpenAI],
+        verbose=True,
+        max_iterations=10,
+        model_configs: Optional[dict[str, ModelConfig]] = None,
+    ):
+        """
+        `llm` is used by the roles (agent, planner, observer) that have no model of their own in `model_configs`,
+        which is read from the environment by default, see `get_model_configs`.
+        """
+        model_configs = get_model_configs() if model_configs is None else model_configs
+        configs = {role: model_configs.get(role) or ModelConfig() for role in ROLES}
+        llms = {role: build_llm(config) if config.model else llm for role, config in configs.items()}
+        self.model_limits = {
+            role: ModelLimits(role, timeout=config.timeout, max_concurrency=config.max_concurrency)
+            for role, config in configs.items()
+        }
+
+        # The models always stream, so `/stream_agent` can forward their tokens from its callback handler. The role
+        # timeout is also sent as the request timeout, which bounds the sync calls too, also with the default model
+        bound = {
+            role: llms[role]
+            .bind(stream=True, **({"timeout": config.timeout} if config.timeout else {}))
+            .with_config(self._llm_config(role))
+            for role, config in configs.items()
+        }
+        self.agent_llm_runnable = with_prompt_caching(
+            Prompts.ReAct.partial(tools=lambda: get_tools().json, tool_names=lambda: get_tools().names), llms["agent"]
+        ) | bound["agent"].bind(stop=STOP_SEQUENCES)
+        self.agent_runnable = self.agent_llm_runnable | react_parser
         self.planner_runnable = (
-            Prompts.Planning.partial(tools=self.tools.json)
-            | llm.bind(stop=STOP_SEQUENCES).with_config({"tags": ["planner"]})
+            with_prompt_caching(Prompts.Planning.partial(tools=lambda: get_tools().json), llms["planner"])
+            | bound["planner"].bind(stop=STOP_SEQUENCES)
             | plan_parser
         )
         self.observer_runnable = (
-            Prompts.Observer.partial() | llm.with_config({"tags": ["observer"]}) | observation_parser
+            with_prompt_caching(Prompts.Observer.partial(), llms["observer"]) | bound["observer"] | observation_parser
         )
         self.verbose = verbose
         self.planner_node_name = "planner"
         self.agent_node_name = "agent"
         self.tools_node_name = "tools"
         self.observer_node_name = "observer"
-        self.loop_count = 0
         self.max_iterations = max_iterations
+        self.speculative_tools = get_speculative_tools()
+        self.speculative_calls = SpeculativeToolCalls()
+        self.tool_timeouts = get_tool_timeouts()
+        self.observer_policy = ObserverPolicy.from_env()
+        self.planner_fast_path = os.getenv("PLANNER_FAST_PATH", "true").lower() == "true"
+        self.plan_cache = PlanCache.from_env()
+
+    @staticmethod
+    def _llm_config(role: str):
+        return {"tags": [role], "callbacks": [PromptCacheUsage(role)]}
+
+    @property
+    def tools(self):
+        return get_tools()
 
     def build_graph(self):
         graph = StateGraph(State)
 
-        graph.add_node(self.planner_node_name, self.planner_node)
-        graph.add_node(self.agent_node_name, self.agent_node)
-        graph.add_node(self.tools_node_name, self.tool_node)
-        graph.add_node(self.observer_node_name, self.observer_node)
+        graph.add_node(self.planner_node_name, RunnableLambda(self.planner_node, afunc=self.aplanner_node))
+        graph.add_node(self.agent_node_name, RunnableLambda(self.agent_node, afunc=self.aagent_node))
+        graph.add_node(self.tools_node_name, RunnableLambda(self.tool_node, afunc=self.atool_node))
+        graph.add_node(self.observer_node_name, RunnableLambda(self.observer_node, afunc=self.aobserver_node))
 
         graph.add_edge(START, self.planner_node_name)
         graph.add_edge(self.planner_node_name, self.agent_node_name)
         graph.add_conditional_edges(
             source=self.agent_node_name,
-            path=self.router,
+            path=RunnableLambda(self.router, afunc=self.arouter),
             path_map=[self.tools_node_name, END, self.agent_node_name],
         )
         graph.add_edge(self.tools_node_name, self.observer_node_name)
@@ -71,34 +120,76 @@ class GraphBuilder:
         return react_graph
 
     def planner_node(self, state: dict):
-        if self.loop_count > self.max_iterations:
-            self.loop_count = 0
-
+        self._log_input(state)
+        key, output = self._known_plan(state)
+        if output is not None:
+            if key is not None:
+                send_event("planner", output)
+            return self._planner_result(output)
+
+        with self.model_limits["planner"].limit():
+            output = self.planner_runnable.invoke({"input": state["input"], "messages": state["messages"]})
+        self.plan_cache.put(key, output)
+        return self._planner_result(output)
+
+    async def aplanner_node(self, state: dict):
+        self._log_input(state)
+        key, output = self._known_plan(state)
+        if output is not None:
+            if key is not None:
+                await asend_event("planner", output)
+            return self._planner_result(output)
+
+        async with self.model_limits["planner"].alimit():
+            output = await self.planner_runnable.ainvoke({"input": state["input"], "messages": state["messages"]})
+        self.plan_cache.put(key, output)
+        return self._planner_result(output)
+
+    def _known_plan(self, state: dict):
+        """
+        The plan cache key and the plan that needs no planner call, from the plan cache or for small talk,
+        which has no key and is not sent to the stream.
+        """
+        if self.planner_fast_path and is_trivial_input(state["input"]):
+            get_metrics().increment("planner_skipped")
+            return None, TRIVIAL_PLAN
+
+        key = self.plan_cache.key(state["input"], self.tools.json, state["messages"])
+        return key, self.plan_cache.get(key)
+
+    def _log_input(self, state: dict):
         if self.verbose:
-            if self.loop_count == 0:
-                print("\033[92m\n\n BEGINNING EXECUTION...\033[0m")
-                print("\033[92m-------------------------------- \n\033[0m")
+            print("\033[92m\n\n BEGINNING EXECUTION...\033[0m")
+            print("\033[92m-------------------------------- \n\033[0m")
 
             messages = "\n".join([f"{message.role}: {message.content}" for message in state["messages"]]).rstrip("\n")
             if messages:
                 print(f"\033[94m{messages}\033[0m")
             print(f"\033[94mUser: {state['input']}\n\033[0m")
 
-        output = self.planner_runnable.invoke({"input": state["input"], "messages": state["messages"]})
+    def _planner_result(self, output: str):
         if self.verbose:
             print("\033[96m-------------------------------- \n\033[0m")
             print(f"\033[96mPlan:\n\033[0m {output}\n")
             print("\033[96m-------------------------------- \n\033[0m")
 
-        return {"plan": output, "steps": None, "output": None}
+        return {"plan": output, "steps": None, "scratchpad": None, "output": None, "iterations": 0}
 
     def router(self, state: dict):
-        self.loop_count += 1
-        if self.loop_count > self.max_iterations:
+        if state["iterations"] > self.max_iterations:
             print("\033[91mMAX ITERATIONS EXCEEDED\033[0m")
             send_event("error", "MAX AGENT ITERATIONS EXCEEDED")
             return END
+        return self._next_node(state)
+
+    async def arouter(self, state: dict):
+        if state["iterations"] > self.max_iterations:
+            print("\033[91mMAX ITERATIONS EXCEEDED\033[0m")
+            await asend_event("error", "MAX AGENT ITERATIONS EXCEEDED")
+            return END
+        return self._next_node(state)
 
+    def _next_node(self, state: dict):
         last_step = state["steps"][-1]
         if isinstance(last_step, Error):
             return self.agent_node_name
@@ -107,106 +198,339 @@ class GraphBuilder:
         return self.tools_node_name
 
     def agent_node(self, state: dict):
-        output = self.agent_runnable.invoke(self._get_inputs(state))
-
+        with self.model_limits["agent"].limit():
+            output = self.agent_runnable.invoke(self._get_inputs(state))
+        if isinstance(output, Error):
+            send_event("error", output.error)
+        return self._agent_result(state, output)
+
+    async def aagent_node(self, state: dict, config: RunnableConfig):
+        tool_names = self.speculative_tools.intersection(self.tools.names)
+        if tool_names:
+            output = await self._astream_agent(state, config, tool_names)
+        else:
+            async with self.model_limits["agent"].alimit():
+                output = await self.agent_runnable.ainvoke(self._get_inputs(state))
+        if isinstance(output, Error):
+            await asend_event("error", output.error)
+        return self._agent_result(state, output)
+
+    async def _astream_agent(self, state: dict, config: RunnableConfig, tool_names: set):
+        """
+        Stream the agent completion and start the tool call as soon as its input is complete, while the model finishes.
+        The call is kept for the tool node if the full completion calls the same tool with the same input.
+        """
+        key = self._speculation_key(config, state["iterations"] + 1)
+        parser = ActionStreamParser(tool_names)
+        message = AIMessageChunk(content="")
+        call: Optional[SpeculativeToolCall] = None
+        try:
+            async with self.model_limits["agent"].alimit():
+                async for chunk in self.agent_llm_runnable.astream(self._get_inputs(state)):
+                    message += chunk
+                    if call is None and (parsed := parser.feed(chunk.content)):
+                        action, action_input = parsed
+                        call = self.speculative_calls.start(key, self.tools.by_name[action], action_input)
+        except BaseException:
+            self.speculative_calls.discard(key)
+            raise
+
+        output = react_parser(message)
+        actions = output.actions if isinstance(output, MultiAction) else [output]
+        if call is not None and not any(isinstance(action, Action) and call.matches(action) for action in actions):
+            self.speculative_calls.discard(key)
+        return output
+
+    @staticmethod
+    def _speculation_key(config: RunnableConfig, iterations: int):
+        return config.get("configurable", {}).get("thread_id"), iterations
+
+    def _agent_result(self, state: dict, output: Union[Action, MultiAction, Finish, Error]):
         if self.verbose:
-            if isinstance(output, Action):
+            if isinstance(output, (Action, MultiAction)):
                 print(f"\033[92mThought:\033[0m {output.thought}")
-                print(f"\033[92mAction:\033[0m {output.action}")
-                formatted_action_input = str(output.action_input).replace("\\n", "\n")
-                print(f"\033[92mAction Input:\033[0m {formatted_action_input}")
+                for action in output.actions if isinstance(output, MultiAction) else [output]:
+                    print(f"\033[92mAction:\033[0m {action.action}")
+                    formatted_action_input = str(action.action_input).replace("\\n", "\n")
+                    print(f"\033[92mAction Input:\033[0m {formatted_action_input}")
             elif isinstance(output, Finish):
                 print(f"\033[95mAI: {output.output}\n\033[0m")
             elif isinstance(output, Error):
                 print(f"\033[91mError:\033[0m {output.error}\n")
                 print(f"\033[91mLog:\033[0m {output.log}\n")
 
-        result = {"steps": [output]}
+        result = {**self._add_steps(output), "iterations": state["iterations"] + 1}
         if isinstance(output, Finish):
             result["messages"] = [
                 Message(role="User", content=state["input"]),
                 Message(role="Agent", content=output.output),
             ]
             result["output"] = output.output
-            self.loop_count = 0
         return result
 
     def _get_inputs(self, state):
-        scratchpad = ""
-        for step in state["steps"]:
-            if isinstance(step, Action):
-                scratchpad += step.scratchpad
-            elif isinstance(step, Observation):
-                scratchpad += f"Observation: < {step.observation} >\n\n"
-            elif isinstance(step, Error):
-                scratchpad += f"Error: {step.error}\n\n"
-
-        messages = ""
-        for msg in state["messages"]:
-            messages += f"{msg.role}: {msg.content}\n"
-
         return {
             "input": state["input"],
-            "messages": messages,
-            "scratchpad": scratchpad,
+            "messages": "".join(f"{msg.role}: {msg.content}\n" for msg in state["messages"]),
+            "scratchpad": "".join(state["scratchpad"]),
             "plan": state["plan"],
         }
 
-    def tool_node(self, state: dict):
-        try:
-            tool_str_to_func = {tool.name: tool for tool in self.tools.functions}
-            last_action = state["steps"][-1]
+    @staticmethod
+    def _render_step(step: Union[Action, MultiAction, ToolOutput, Observation, Finish, Error]) -> str:
+        if isinstance(step, (Action, MultiAction)):
+            return step.scratchpad
+        elif isinstance(step, Observation):
+            return f"Observation: < {step.observation} >\n\n"
+        elif isinstance(step, Error):
+            return f"Error: {step.error}\n\n"
+        return ""
+
+    def _add_steps(self, *steps: Union[Action, MultiAction, ToolOutput, Observation, Finish, Error]):
+        """
+        Build the state update for new steps, rendering each step into the scratchpad once as it is added.
+        """
+        update = {"steps": list(steps)}
+        scratchpad = [rendered for step in steps if (rendered := self._render_step(step))]
+        if scratchpad:
+            update["scratchpad"] = scratchpad
+        return update
 
-            if last_action.action not in tool_str_to_func:
-                error = f"Invalid tool name `{last_action.action}`"
-                if self.verbose:
-                    print(f"\033[91mError:\033[0m {error}\n")
+    def tool_node(self, state: dict):
+        last_action = state["steps"][-1]
+        if isinstance(last_action, MultiAction):
+            return self._batch_result(self._run_actions(last_action.actions))
+
+        if last_action.action not in self.tools.by_name:
+            error = self._invalid_tool_error(last_action)
+            send_event("error", error)
+            return self._add_steps(Error(error=error))
+
+        [output] = self._invoke_actions([last_action])
+        if isinstance(output, Exception):
+            error = self._tool_error(last_action, output)
+            send_event("tool_error", error)
+            return self._add_steps(Error(error=error))
+        return self._tool_result(output)
+
+    def _run_actions(self, actions: list[Action]) -> list[tuple[str, bool]]:
+        """
+        Run independent actions concurrently, returning the output or the error of each action and whether it failed.
+        """
+        outputs = iter(self._invoke_actions([action for action in actions if action.action in self.tools.by_name]))
+        results = []
+        for action in actions:
+            if action.action not in self.tools.by_name:
+                error = self._invalid_tool_error(action)
                 send_event("error", error)
-                return {"steps": [Error(error=error)]}
+                results.append((error, True))
+                continue
+
+            output = next(outputs)
+            if isinstance(output, Exception):
+                error = self._tool_error(action, output)
+                send_event("tool_error", error)
+                results.append((error, True))
+            else:
+                results.append((self._action_output(action, output), False))
+        return results
+
+    def _invoke_actions(self, actions: list[Action]) -> list[Any]:
+        """
+        Run the tools of the actions on threads, each with its timeout. Returns the output of each action,
+        or the exception it raised.
+        """
+        pool = ContextThreadPoolExecutor(max_workers=max(len(actions), 1))
+        started = time.monotonic()
+        futures = [pool.submit(self.tools.by_name[action.action].invoke, action.action_input) for action in actions]
+        outputs = []
+        try:
+            for action, future in zip(actions, futures):
+                timeout = self._tool_timeout(action)
+                try:
+                    outputs.append(
+                        future.result(None if timeout is None else max(0, started + timeout - time.monotonic()))
+                    )
+                except TimeoutError:
+                    outputs.append(TimeoutError(f"timed out after {timeout} seconds"))
+                except Exception as e:
+                    outputs.append(e)
+        finally:
+            # Do not wait for the tools that timed out
+            pool.shutdown(wait=False, cancel_futures=True)
+        return outputs
+
+    async def atool_node(self, state: dict, config: RunnableConfig):
+        last_action = state["steps"][-1]
+        call = self.speculative_calls.pop(self._speculation_key(config, state["iterations"]))
+        if isinstance(last_action, MultiAction):
+            results = await asyncio.gather(
+                *(self._arun_batched_action(action, config, call) for action in last_action.actions)
+            )
+            return self._batch_result(results)
 
-            tool_input = last_action.action_input
-            output = tool_str_to_func[last_action.action].invoke(tool_input)
+        if last_action.action not in self.tools.by_name:
+            error = self._invalid_tool_error(last_action)
+            await asend_event("error", error)
+            return self._add_steps(Error(error=error))
 
-            if self.verbose:
-                print(f"\033[92mTool Output: \033[93m< {str(output).strip()} >\033[92m\n\033[0m")
+        try:
+            output = await self._ainvoke_action(last_action, config, call)
+        except Exception as e:
+            error = self._tool_error(last_action, e)
+            await asend_event("tool_error", error)
+            return self._add_steps(Error(error=error))
+        return self._tool_result(output)
+
+    async def _arun_batched_action(
+        self, action: Action, config: RunnableConfig, call: Optional[SpeculativeToolCall]
+    ) -> tuple[str, bool]:
+        if action.action not in self.tools.by_name:
+            error = self._invalid_tool_error(action)
+            await asend_event("error", error)
+            return error, True
 
-            return {"steps": [ToolOutput(tool_output=str(output).strip())]}
+        try:
+            output = await self._ainvoke_action(action, config, call)
         except Exception as e:
-            error_message = f"Action `{last_action.action}` failed: < {str(e)} >"
-            if self.verbose:
-                print(f"\033[91mError:\033[0m {error_message}\n")
-            send_event("tool_error", error_message)
-            return {"steps": [Error(error=error_message)]}
+            error = self._tool_error(action, e)
+            await asend_event("tool_error", error)
+            return error, True
+        return self._action_output(action, output), False
+
+    async def _ainvoke_action(self, action: Action, config: RunnableConfig, call: Optional[SpeculativeToolCall]):
+        """
+        Run the tool of the action with its timeout, using the result of the speculative call if it made the same call.
+        """
+        tool = self.tools.by_name[action.action]
+        timeout = self._tool_timeout(action)
+        try:
+            if call is not None and call.matches(action):
+                try:
+                    output = await asyncio.wait_for(call.task, timeout)
+                except asyncio.TimeoutError:
+                    raise
+                except Exception:
+                    # Run the tool again below, so its error is reported like any other
+                    pass
+                else:
+                    await areport_tool_run(tool, action.action_input, output, config)
+                    return output
+            return await asyncio.wait_for(tool.ainvoke(action.action_input), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"timed out after {timeout} seconds") from None
+
+    def _tool_timeout(self, action: Action) -> Optional[float]:
+        return self.tool_timeouts.get(action.action, self.tool_timeouts.get("default"))
+
+    @staticmethod
+    def _action_output(action: Action, output: Any) -> str:
+        return f"Action `{action.action}` output: < {str(output).strip()} >"
+
+    def _invalid_tool_error(self, action: Action):
+        error = f"Invalid tool name `{action.action}`"
+        if self.verbose:
+            print(f"\033[91mError:\033[0m {error}\n")
+        return error
+
+    def _tool_error(self, action: Action, e: Exception):
+        error_message = f"Action `{action.action}` failed: < {str(e)} >"
+        if self.verbose:
+            print(f"\033[91mError:\033[0m {error_message}\n")
+        return error_message
+
+    def _tool_result(self, output: Any, failed: bool = False):
+        if self.verbose:
+            print(f"\033[92mTool Output: \033[93m< {str(output).strip()} >\033[92m\n\033[0m")
+
+        return self._add_steps(ToolOutput(tool_output=str(output).strip(), failed=failed))
+
+    def _batch_result(self, results: list[tuple[str, bool]]):
+        """
+        Combine the outputs of the actions of a batch, and whether they failed, into one tool output.
+        """
+        return self._tool_result(
+            "\n\n".join(output for output, _ in results), failed=any(failed for _, failed in results)
+        )
 
     def observer_node(self, state: dict):
+        observation = self._direct_observation(state)
+        if observation is not None:
+            send_event("observer", f"Observation: {observation.observation}")
+            return self._observer_result(observation)
+
         try:
-            tool_node_output = state["steps"][-1]
-            if isinstance(tool_node_output, ToolOutput):
-                raw_tool_output = tool_node_output.tool_output
-            elif isinstance(tool_node_output, Error):
-                raw_tool_output = f"Error: {tool_node_output.error}"
-            else:
-                raise Exception("Reviewer node called with no Observation!")
-
-            action = state["steps"][-2]
-            if not isinstance(action, Action):
-                raise Exception("Reviewer node called with no Action information")
-
-            output = self.observer_runnable.invoke(
-                {
-                    "thought": action.thought,
-                    "action": action.action,
-                    "action_input": f"< {json.dumps(action.action_input)} >",
-                    "tool_output": raw_tool_output,
-                }
-            )
+            with self.model_limits["observer"].limit():
+                output = self.observer_runnable.invoke(self._get_observer_inputs(state))
+        except Exception as e:
+            self._log_observer_error(e)
+            send_event("error", str(e))
+            return self._add_steps(Error(error=str(e)))
+        return self._observer_result(output)
 
-            if self.verbose:
-                print(f"\033[92mObservation: \033[93m< {output.observation} >\033[92m\n\033[0m")
+    async def aobserver_node(self, state: dict):
+        observation = self._direct_observation(state)
+        if observation is not None:
+            await asend_event("observer", f"Observation: {observation.observation}")
+            return self._observer_result(observation)
 
-            return {"steps": [output]}
+        try:
+            async with self.model_limits["observer"].alimit():
+                output = await self.observer_runnable.ainvoke(self._get_observer_inputs(state))
         except Exception as e:
-            if self.verbose:
-                print(f"\033[91mError in observer_node:\033[0m {e}\n")
-            send_event("error", str(e))
-            return {"steps": [Error(error=str(e))]}
+            self._log_observer_error(e)
+            await asend_event("error", str(e))
+            return self._add_steps(Error(error=str(e)))
+        return self._observer_result(output)
+
+    def _direct_observation(self, state: dict) -> Optional[Observation]:
+        """
+        Use the tool output as the observation, without an observer model call, if the observer policy allows it.
+        Errors, also those of any action of a batch, always go to the observer model, which suggests how to fix them.
+        """
+        tool_node_output, action = state["steps"][-1], state["steps"][-2]
+        if not isinstance(tool_node_output, ToolOutput) or tool_node_output.failed:
+            return None
+        if isinstance(action, MultiAction):
+            return self.observer_policy.observe([batched.action for batched in action.actions], tool_node_output.tool_output)
+        if isinstance(action, Action):
+            return self.observer_policy.observe([action.action], tool_node_output.tool_output)
+        return None
+
+    def _get_observer_inputs(self, state: dict):
+        tool_node_output = state["steps"][-1]
+        if isinstance(tool_node_output, ToolOutput):
+            raw_tool_output = tool_node_output.tool_output
+        elif isinstance(tool_node_output, Error):
+            raw_tool_output = f"Error: {tool_node_output.error}"
+        else:
+            raise Exception("Reviewer node called with no Observation!")
+
+        action = state["steps"][-2]
+        if isinstance(action, MultiAction):
+            # The observer summarises the outputs of all the actions of the batch in one observation
+            return {
+                "thought": action.thought,
+                "action": ", ".join(batched.action for batched in action.actions),
+                "action_input": ", ".join(f"< {json.dumps(batched.action_input)} >" for batched in action.actions),
+                "tool_output": raw_tool_output,
+            }
+        if not isinstance(action, Action):
+            raise Exception("Reviewer node called with no Action information")
+
+        return {
+            "thought": action.thought,
+            "action": action.action,
+            "action_input": f"< {json.dumps(action.action_input)} >",
+            "tool_output": raw_tool_output,
+        }
+
+    def _observer_result(self, output: Observation):
+        if self.verbose:
+            print(f"\033[92mObservation: \033[93m< {output.observation} >\033[92m\n\033[0m")
+
+        return self._add_steps(output)
+
+    def _log_observer_error(self, e: Exception):
+        if self.verbose:
+            print(f"\033[91mError in observer_node:\033[0m {e}\n")
@@ -0,0 +1,46 @@
+import os
+from typing import Iterable, Optional, Set
+from schema.agent_outputs import Observation
+
+
+def _tool_names(names: str) -> Set[str]:
+    return {name.strip() for name in names.split(",") if name.strip()}
+
+
+class ObserverPolicy:
+    """
+    Decides which tool outputs are worth an observer model call.
+
+    The output of `direct_tools` (small, deterministic outputs) and any output of at most `max_direct_chars` characters
+    from a tool that is not in `summarized_tools` (large, noisy outputs) is used as the observation as it is.
+    A batch of actions is observed directly only if each of its tools would be.
+    """
+
+    def __init__(
+        self,
+        direct_tools: Iterable[str] = ("calculator", "current_datetime"),
+        summarized_tools: Iterable[str] = ("search", "get_context"),
+        max_direct_chars: int = 300,
+    ):
+        self.direct_tools = set(direct_tools)
+        self.summarized_tools = set(summarized_tools)
+        self.max_direct_chars = max_direct_chars
+
+    @classmethod
+    def from_env(cls) -> "ObserverPolicy":
+        return cls(
+            direct_tools=_tool_names(os.getenv("OBSERVER_DIRECT_TOOLS", "calculator,current_datetime")),
+            summarized_tools=_tool_names(os.getenv("OBSERVER_SUMMARIZED_TOOLS", "search,get_context")),
+            max_direct_chars=int(os.getenv("OBSERVER_MAX_DIRECT_CHARS") or 300),
+        )
+
+    def observe(self, tools: Iterable[str], tool_output: str) -> Optional[Observation]:
+        """
+        The observation of the tool output if it needs no observer model call, None otherwise.
+        """
+        tools = set(tools)
+        if tools <= self.direct_tools:
+            return Observation(observation=tool_output)
+        if len(tool_output) <= self.max_direct_chars and not tools & self.summarized_tools:
+            return Observation(observation=tool_output)
+        return None
@@ -0,0 +1,85 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from schema.message import Message
+from metrics.metrics import get_metrics
+
+# The plan for inputs that need no planning, the agent answers them directly
+TRIVIAL_PLAN = "1. Respond to the user"
+
+# Greetings, thanks and goodbyes, replies like "yes" are left out as they can confirm a tool call the agent proposed
+_TRIVIAL_INPUT = re.compile(
+    r"(hi|hello|hey|hiya|good (morning|afternoon|evening)|thanks|thank you|thx|cheers|bye|goodbye|see you)"
+    r"( there| again| so much| very much| a lot| for your help| later)*"
+)
+
+
+def normalize_input(text: str) -> str:
+    """
+    Lowercase the input, collapse its whitespace and drop the punctuation that ends it.
+    """
+    return " ".join(text.lower().split()).rstrip(" .!?")
+
+
+def is_trivial_input(text: str) -> bool:
+    """
+    Whether the input is small talk that needs no plan.
+    """
+    words = " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+    return _TRIVIAL_INPUT.fullmatch(words) is not None
+
+
+class PlanCache:
+    """
+    Caches plans by everything the planner sees: the normalized input, the tool set and the conversation so far.
+
+    Keeps the `max_size` most recently used plans for at most `ttl` seconds, a `max_size` of 0 disables the cache.
+    Hits and misses are counted in the metrics as `plan_cache_hits` and `plan_cache_misses`.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._plans: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "PlanCache":
+        return cls(
+            max_size=int(os.getenv("PLAN_CACHE_SIZE") or 256),
+            ttl=float(os.getenv("PLAN_CACHE_TTL_SECONDS") or 3600),
+        )
+
+    @staticmethod
+    def key(text: str, tools: str, messages: List[Message]) -> str:
+        key = hashlib.sha256(normalize_input(text).encode())
+        key.update(hashlib.sha256(tools.encode()).digest())
+        for message in messages:
+            key.update(f"{message.role}: {message.content}\n".encode())
+        return key.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.max_size:
+            return None
+        with self._lock:
+            expires, plan = self._plans.get(key, (0, None))
+            if plan is not None and expires > time.monotonic():
+                self._plans.move_to_end(key)
+            else:
+                self._plans.pop(key, None)
+                plan = None
+        get_metrics().increment("plan_cache_hits" if plan is not None else "plan_cache_misses")
+        return plan
+
+    def put(self, key: str, plan: str):
+        if not self.max_size:
+            return
+        with self._lock:
+            self._plans[key] = (time.monotonic() + self.ttl, plan)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
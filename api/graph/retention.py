@@ -0,0 +1,59 @@
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    How long checkpoints are kept by the savers that support compaction.
+
+    max_checkpoints: keep only the newest N checkpoints per thread/namespace, None keeps them all.
+    thread_ttl: delete threads that have not been written to for this many seconds, None never expires them.
+    compaction_interval: seconds between background compaction runs.
+    blob_grace_period: keep unreferenced channel values written in the last N seconds, their checkpoint may still
+        be being written.
+    """
+
+    max_checkpoints: Optional[int] = None
+    thread_ttl: Optional[float] = None
+    compaction_interval: float = 3600
+    blob_grace_period: float = 600
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        max_checkpoints = os.getenv("CHECKPOINT_MAX_PER_THREAD")
+        thread_ttl = os.getenv("CHECKPOINT_THREAD_TTL_SECONDS")
+        return cls(
+            max_checkpoints=int(max_checkpoints) if max_checkpoints else None,
+            thread_ttl=float(thread_ttl) if thread_ttl else None,
+            compaction_interval=float(os.getenv("CHECKPOINT_COMPACTION_INTERVAL_SECONDS") or 3600),
+            blob_grace_period=float(os.getenv("CHECKPOINT_BLOB_GRACE_SECONDS") or 600),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_checkpoints is not None or self.thread_ttl is not None
+
+
+async def compact_periodically(checkpointer: BaseCheckpointSaver, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await asyncio.to_thread(checkpointer.compact)
+            logging.info(f"Checkpoint compaction: {result}")
+        except Exception as e:
+            logging.error(f"Checkpoint compaction failed: {e}")
+
+
+def start_compaction(checkpointer: BaseCheckpointSaver) -> Optional[asyncio.Task]:
+    """
+    Start the background compaction task if the checkpointer supports it and has a retention policy.
+    """
+    retention = getattr(checkpointer, "retention", None)
+    if not hasattr(checkpointer, "compact") or retention is None or not retention.enabled:
+        return None
+    return asyncio.create_task(compact_periodically(checkpointer, retention.compaction_interval))
@@ -0,0 +1,76 @@
+import os
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional, Set, Union
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import get_async_callback_manager_for_config
+from langchain_core.tools import BaseTool
+from schema.agent_outputs import Action
+
+
+def get_speculative_tools() -> Set[str]:
+    """
+    The tools that may start while the agent is still streaming its completion, they must be free of side effects
+    as their result is thrown away when the final completion calls something else.
+    """
+    tools = os.getenv("SPECULATIVE_TOOLS", "search,get_context")
+    return {tool.strip() for tool in tools.split(",") if tool.strip()}
+
+
+@dataclass
+class SpeculativeToolCall:
+    action: str
+    action_input: Union[str, dict]
+    task: asyncio.Task
+
+    def matches(self, action: Action) -> bool:
+        return self.action == action.action and self.action_input == action.action_input
+
+
+class SpeculativeToolCalls:
+    """
+    Tool calls started by the agent node before its completion ended, for the tool node to pick up.
+
+    Keyed by thread and iteration, runs on a thread are serialized so the tool node finds the call of its agent node.
+    At most `max_pending` calls are kept, the oldest are cancelled, in case a run stopped between the two nodes.
+    """
+
+    def __init__(self, max_pending: int = 100):
+        self.max_pending = max_pending
+        self._calls: "OrderedDict[Hashable, SpeculativeToolCall]" = OrderedDict()
+
+    def start(self, key: Hashable, tool: BaseTool, action_input: Union[str, dict]) -> SpeculativeToolCall:
+        self.discard(key)
+        # Run without the callbacks of the graph, the tool node reports the run if its result is used
+        task = asyncio.create_task(tool.arun(action_input))
+        # Retrieve the error of calls nobody waits for, so it is not logged as never retrieved
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        call = SpeculativeToolCall(tool.name, action_input, task)
+        self._calls[key] = call
+        while len(self._calls) > self.max_pending:
+            _, oldest = self._calls.popitem(last=False)
+            oldest.task.cancel()
+        return call
+
+    def discard(self, key: Hashable):
+        call = self._calls.pop(key, None)
+        if call is not None:
+            call.task.cancel()
+
+    def pop(self, key: Hashable) -> Optional[SpeculativeToolCall]:
+        return self._calls.pop(key, None)
+
+
+async def areport_tool_run(tool: BaseTool, tool_input: Union[str, dict], output: Any, config: RunnableConfig):
+    """
+    Send the start and end callbacks of a tool run that ran speculatively, like `tool.ainvoke` would have,
+    so streamed `tool_start` and `tool_end` events stay the same.
+    """
+    callback_manager = get_async_callback_manager_for_config(config)
+    run_manager = await callback_manager.on_tool_start(
+        {"name": tool.name, "description": tool.description},
+        tool_input if isinstance(tool_input, str) else str(tool_input),
+        inputs=tool_input if isinstance(tool_input, dict) else None,
+    )
+    await run_manager.on_tool_end(output, name=tool.name)
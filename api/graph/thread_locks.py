@@ -0,0 +1,188 @@
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Dict, Optional
+from uuid import uuid4
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+MODES = ("queue", "reject", "cancel")
+
+
+class ThreadBusyError(Exception):
+    """
+    Raised in "reject" mode when another run already holds the thread.
+    """
+
+
+class RunCancelledError(Exception):
+    """
+    Raised in "cancel" mode in a run that was cancelled, or never started, because a newer request arrived on its thread.
+    """
+
+
+class MongoLease:
+    """
+    A lease per thread in the `thread_leases` collection, so only one worker at a time runs a thread.
+
+    The holder renews the lease every ttl / 3 seconds, a lease that is not renewed (e.g. the worker died) expires after
+    `ttl` seconds and can be taken over. In "cancel" mode a newer request sets `cancel_requested` on the lease and the
+    holder cancels its run on the next renewal.
+    """
+
+    def __init__(self, host: str, port: int, db_name: str = "checkpoints", ttl: float = 30, poll_interval: float = 0.25):
+        self.leases = AsyncIOMotorClient(host=host, port=port)[db_name]["thread_leases"]
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._indexed = False
+
+    async def ensure_indexes(self):
+        if self._indexed:
+            return
+        try:
+            # Removes leases left behind by stopped workers, expired leases can be taken over before that anyway
+            await self.leases.create_index("expires_at", name="lease_expiry", expireAfterSeconds=0)
+            self._indexed = True
+        except PyMongoError as e:
+            logging.error(f"Failed to create the thread lease index: {e}")
+
+    def _expires_at(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+
+    async def acquire(self, thread_id: str, owner: str, mode: str):
+        await self.ensure_indexes()
+        cancel_requested = False
+        while True:
+            try:
+                await self.leases.update_one(
+                    {"_id": thread_id, "$or": [{"expires_at": {"$lt": datetime.now(timezone.utc)}}, {"owner": owner}]},
+                    {"$set": {"owner": owner, "expires_at": self._expires_at(), "cancel_requested": False}},
+                    upsert=True,
+                )
+                return
+            except DuplicateKeyError:
+                # The lease exists and is held by another worker
+                if mode == "reject":
+                    raise ThreadBusyError(thread_id)
+                if mode == "cancel" and not cancel_requested:
+                    await self.leases.update_one({"_id": thread_id}, {"$set": {"cancel_requested": True}})
+                    cancel_requested = True
+            await asyncio.sleep(self.poll_interval)
+
+    async def keep_alive(self, thread_id: str, owner: str, on_cancel: Callable[[], None]):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                lease = await self.leases.find_one_and_update(
+                    {"_id": thread_id, "owner": owner},
+                    {"$set": {"expires_at": self._expires_at()}},
+                    return_document=ReturnDocument.AFTER,
+                )
+            except PyMongoError as e:
+                logging.error(f"Failed to renew the lease of thread {thread_id}: {e}")
+                continue
+            if lease is None:
+                logging.error(f"Lost the lease of thread {thread_id}")
+            elif lease.get("cancel_requested"):
+                on_cancel()
+
+    async def release(self, thread_id: str, owner: str):
+        try:
+            await self.leases.delete_one({"_id": thread_id, "owner": owner})
+        except PyMongoError as e:
+            logging.error(f"Failed to release the lease of thread {thread_id}: {e}")
+
+
+class _ThreadRun:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+        self.latest = 0
+        self.task: Optional[asyncio.Task] = None
+        self.cancelled = False
+
+    def cancel(self):
+        if self.task is not None and not self.cancelled:
+            self.cancelled = True
+            self.task.cancel()
+
+
+class ThreadLocks:
+    """
+    Serializes runs on the same thread_id, so concurrent requests (double submits, retries) do not interleave
+    their checkpoints. When a thread is busy a new request either waits for it ("queue"), fails with
+    `ThreadBusyError` ("reject") or cancels the running and waiting runs, which fail with `RunCancelledError` ("cancel").
+
+    The lock is per process, with several workers pass a `MongoLease` to also hold a lease across workers.
+    """
+
+    def __init__(self, mode: str = "queue", lease: Optional[MongoLease] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unsupported thread concurrency mode `{mode}`, must be one of {MODES}")
+        self.mode = mode
+        self.lease = lease
+        self._runs: Dict[str, _ThreadRun] = {}
+
+    @classmethod
+    def from_env(cls) -> "ThreadLocks":
+        lease = None
+        if os.getenv("THREAD_LEASES", "false").lower() == "true":
+            if os.getenv("MONGO_HOST") and os.getenv("MONGO_PORT"):
+                lease = MongoLease(
+                    host=os.getenv("MONGO_HOST"),
+                    port=int(os.getenv("MONGO_PORT")),
+                    ttl=float(os.getenv("THREAD_LEASE_TTL_SECONDS") or 30),
+                )
+            else:
+                logging.error("THREAD_LEASES requires MONGO_HOST and MONGO_PORT, only locking threads in process.")
+        return cls(mode=os.getenv("THREAD_CONCURRENCY") or "queue", lease=lease)
+
+    @asynccontextmanager
+    async def hold(self, thread_id: str) -> AsyncIterator[None]:
+        thread_id = str(thread_id)
+        run = self._runs.setdefault(thread_id, _ThreadRun())
+        if run.lock.locked() and self.mode == "reject":
+            raise ThreadBusyError(thread_id)
+
+        run.users += 1
+        run.latest += 1
+        generation = run.latest
+        try:
+            if self.mode == "cancel":
+                run.cancel()
+            async with run.lock:
+                # Superseded by a newer request while waiting for the lock
+                if self.mode == "cancel" and run.latest != generation:
+                    raise RunCancelledError(thread_id)
+                async with self._lease(thread_id, run):
+                    yield
+        finally:
+            run.users -= 1
+            if not run.users:
+                self._runs.pop(thread_id, None)
+
+    @asynccontextmanager
+    async def _lease(self, thread_id: str, run: _ThreadRun) -> AsyncIterator[None]:
+        owner = uuid4().hex
+        if self.lease:
+            await self.lease.acquire(thread_id, owner, self.mode)
+        keep_alive = asyncio.create_task(self.lease.keep_alive(thread_id, owner, run.cancel)) if self.lease else None
+
+        run.task = asyncio.current_task()
+        run.cancelled = False
+        try:
+            yield
+        except asyncio.CancelledError:
+            # Only turn our own cancellation into an error, a cancelled request (e.g. client disconnect) stays cancelled
+            if run.cancelled and run.task.uncancel() == 0:
+                raise RunCancelledError(thread_id) from None
+            raise
+        finally:
+            run.task = None
+            if keep_alive:
+                keep_alive.cancel()
+            if self.lease:
+                await self.lease.release(thread_id, owner)
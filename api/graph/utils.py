@@ -1,33 +1,102 @@
 import os
 from pymongo import MongoClient
-from langgraph.checkpoint.memory import MemorySaver
 from mongo.mongo_saver import MongoDBSaver
+from memory.bounded_memory_saver import BoundedMemorySaver
+from sqlite.sqlite_saver import SQLiteSaver
+from cache.write_behind_saver import WriteBehindSaver
+from .retention import RetentionPolicy
 from langchain_core.runnables.graph import CurveStyle
 from langgraph.graph.state import CompiledStateGraph
+from langchain_core.runnables import RunnableConfig
+from schema.agent_outputs import Finish
 import logging
-from langchain_core.callbacks.manager import adispatch_custom_event
+from langchain_core.callbacks.manager import adispatch_custom_event, dispatch_custom_event
 import asyncio
-from typing import Any
+from typing import Any, Optional
 import json
 
 
 def get_checkpointer():
+    saver = get_saver()
+    # The memory saver is already in process, there is nothing to write behind
+    if os.getenv("CHECKPOINT_WRITE_BEHIND", "false").lower() == "true" and not isinstance(saver, BoundedMemorySaver):
+        logging.info("Using write-behind checkpoint cache.")
+        return WriteBehindSaver(saver)
+    return saver
+
+
+async def flush_checkpointer(checkpointer: Any, thread_id: Optional[str] = None):
+    """
+    Wait for the checkpoints of `thread_id`, or of every thread, queued by a write-behind checkpointer to be written,
+    a no-op for other checkpointers.
+    """
+    if isinstance(checkpointer, WriteBehindSaver):
+        await checkpointer.aflush(thread_id)
+
+
+def get_saver():
     mongo_host = os.getenv("MONGO_HOST")
     mongo_port = os.getenv("MONGO_PORT")
 
     if not mongo_host or not mongo_port:
-        logging.info("Using default memory saver.")
-        return MemorySaver()
+        return get_local_checkpointer()
 
     try:
         mongo_port = int(mongo_port)
         client = MongoClient(mongo_host, mongo_port)
         client.admin.command("ismaster")
         logging.info("Using MongoDB as checkpoint saver.")
-        return MongoDBSaver(host=mongo_host, port=mongo_port, db_name="checkpoints")
+        return MongoDBSaver(
+            host=mongo_host,
+            port=mongo_port,
+            db_name="checkpoints",
+            background_indexes=os.getenv("MONGO_BACKGROUND_INDEXES", "false").lower() == "true",
+            retention=RetentionPolicy.from_env(),
+            delta=os.getenv("MONGO_CHECKPOINT_DELTA", "false").lower() == "true",
+            compression=os.getenv("MONGO_CHECKPOINT_COMPRESSION") or None,
+        )
     except Exception as e:
-        logging.info(f"MongoDB connection failed: {e}. Using default memory saver.")
-        return MemorySaver()
+        logging.info(f"MongoDB connection failed: {e}. Using a local checkpoint saver.")
+        return get_local_checkpointer()
+
+
+def get_local_checkpointer():
+    sqlite_path = os.getenv("SQLITE_CHECKPOINT_PATH")
+    if sqlite_path:
+        logging.info("Using SQLite as checkpoint saver.")
+        return SQLiteSaver(sqlite_path, retention=RetentionPolicy.from_env())
+
+    logging.info("Using default memory saver.")
+    return get_memory_saver()
+
+
+def get_memory_saver():
+    max_threads = os.getenv("MEMORY_SAVER_MAX_THREADS")
+    max_bytes = os.getenv("MEMORY_SAVER_MAX_BYTES")
+    return BoundedMemorySaver(
+        max_threads=int(max_threads) if max_threads else None,
+        max_bytes=int(max_bytes) if max_bytes else None,
+        spill_dir=os.getenv("MEMORY_SAVER_SPILL_DIR") or None,
+    )
+
+
+async def arecord_cancellation(graph: CompiledStateGraph, config: RunnableConfig, reason: str):
+    """
+    Finish a cancelled run with `reason` as its output, so the thread's latest checkpoint is a completed run
+    rather than one with nodes still pending. A no-op if the run had already finished.
+    """
+    snapshot = await graph.aget_state(config)
+    if not snapshot.next:
+        return
+    await graph.aupdate_state(
+        config,
+        {
+            "output": reason,
+            "steps": [Finish(output=reason, log=reason)],
+            "iterations": snapshot.values.get("iterations") or 0,
+        },
+        as_node="agent",
+    )
 
 
 def render_graph(graph: CompiledStateGraph):
@@ -40,8 +109,47 @@ def render_graph(graph: CompiledStateGraph):
         logging.error(f"Error rendering graph: {e}")
 
 
+# Dispatches scheduled by `send_event`, until they are done, see `adrain_events`
+_background_events = set()
+
+
 def send_event(event_name: str, event_data: Any):
-    asyncio.run(adispatch_custom_event(event_name, event_data))
+    """
+    Dispatch a custom event from sync code.
+
+    Dispatches inline when no event loop is running, otherwise schedules the dispatch on the running loop,
+    so it can run after the events sent later: await `adrain_events` before closing a stream.
+    Use `asend_event` from async code.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    if loop is None:
+        try:
+            dispatch_custom_event(event_name, event_data)
+        except RuntimeError as e:
+            logging.error(f"Failed to send event '{event_name}': {e}")
+    else:
+        task = loop.create_task(asend_event(event_name, event_data))
+        _background_events.add(task)
+        task.add_done_callback(_background_events.discard)
+
+
+async def asend_event(event_name: str, event_data: Any):
+    try:
+        await adispatch_custom_event(event_name, event_data)
+    except RuntimeError as e:
+        logging.error(f"Failed to send event '{event_name}': {e}")
+
+
+async def adrain_events():
+    """
+    Wait for the events `send_event` scheduled on the running loop to be dispatched.
+    """
+    while pending := [task for task in _background_events if task.get_loop() is asyncio.get_running_loop()]:
+        await asyncio.gather(*pending, return_exceptions=True)
 
 
 def state_to_string(state: dict) -> str:
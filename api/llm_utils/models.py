@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, Optional, Union
+from langchain_anthropic import ChatAnthropic
+from langchain_openai import ChatOpenAI
+from metrics.metrics import get_metrics
+from llm_utils.prompt_caching import anthropic_headers
+
+ROLES = ("agent", "planner", "observer")
+
+
+@dataclass
+class ModelConfig:
+    model: Optional[str] = None
+    timeout: Optional[float] = None
+    max_concurrency: Optional[int] = None
+
+
+def get_model_configs() -> Dict[str, ModelConfig]:
+    """
+    Get the model config of each role from the JSON file at MODEL_CONFIG_PATH, e.g.
+    `{"observer": {"model": "openai:gpt-4o-mini", "timeout": 30, "max_concurrency": 8}}`,
+    and the <ROLE>_MODEL, <ROLE>_MODEL_TIMEOUT_SECONDS and <ROLE>_MODEL_MAX_CONCURRENCY variables, which take precedence.
+
+    Models are given as `provider:model`, with anthropic or openai as the provider. Roles without a model use the
+    default model of the API.
+    """
+    configs = {}
+    if os.getenv("MODEL_CONFIG_PATH"):
+        with open(os.getenv("MODEL_CONFIG_PATH")) as f:
+            configs = json.load(f)
+        unknown = set(configs) - set(ROLES)
+        if unknown:
+            raise ValueError(f"Unknown model roles {sorted(unknown)} in MODEL_CONFIG_PATH, must be one of {ROLES}")
+
+    models = {}
+    for role in ROLES:
+        config = ModelConfig(**configs.get(role, {}))
+        prefix = role.upper()
+        if os.getenv(f"{prefix}_MODEL"):
+            config.model = os.getenv(f"{prefix}_MODEL")
+        if os.getenv(f"{prefix}_MODEL_TIMEOUT_SECONDS"):
+            config.timeout = float(os.getenv(f"{prefix}_MODEL_TIMEOUT_SECONDS"))
+        if os.getenv(f"{prefix}_MODEL_MAX_CONCURRENCY"):
+            config.max_concurrency = int(os.getenv(f"{prefix}_MODEL_MAX_CONCURRENCY"))
+        models[role] = config
+    return models
+
+
+def build_llm(config: ModelConfig) -> Union[ChatAnthropic, ChatOpenAI]:
+    provider, _, name = config.model.partition(":")
+    if provider == "anthropic":
+        return ChatAnthropic(model=name, temperature=0, timeout=config.timeout, default_headers=anthropic_headers())
+    elif provider == "openai":
+        return ChatOpenAI(model=name, timeout=config.timeout, stream_usage=True)
+    raise ValueError(f"Unsupported model `{config.model}`, must be anthropic:<model> or openai:<model>")
+
+
+class ModelLimits:
+    """
+    Limits the concurrent model calls of a role and their duration, and reports their latency in the metrics
+    as `<role>_model_latency_seconds`, with the calls that timed out counted in `<role>_model_timeouts`.
+
+    Sync and async calls share the concurrency limit. The timeout is enforced on async calls here, sync calls rely on
+    the request timeout that GraphBuilder binds to the model, which the model client applies to each read of the stream.
+    """
+
+    # How often async calls retry to acquire the limit while it is held, they must not block the event loop
+    poll_interval = 0.01
+
+    def __init__(self, role: str, timeout: Optional[float] = None, max_concurrency: Optional[int] = None):
+        self.role = role
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    @contextmanager
+    def limit(self) -> Iterator[None]:
+        if self._semaphore:
+            self._semaphore.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            get_metrics().observe(f"{self.role}_model_latency_seconds", time.monotonic() - started)
+            if self._semaphore:
+                self._semaphore.release()
+
+    @asynccontextmanager
+    async def alimit(self) -> AsyncIterator[None]:
+        if self._semaphore:
+            while not self._semaphore.acquire(blocking=False):
+                await asyncio.sleep(self.poll_interval)
+        started = time.monotonic()
+        deadline = asyncio.timeout(self.timeout)
+        try:
+            async with deadline:
+                yield
+        except TimeoutError:
+            if not deadline.expired():
+                raise
+            get_metrics().increment(f"{self.role}_model_timeouts")
+            raise TimeoutError(f"The {self.role} model did not respond within {self.timeout} seconds") from None
+        finally:
+            get_metrics().observe(f"{self.role}_model_latency_seconds", time.monotonic() - started)
+            if self._semaphore:
+                self._semaphore.release()
@@ -1,18 +1,17 @@
 import re
-from typing import Union
-from schema.agent_outputs import Action, Finish, Error, Observation
+from typing import Iterable, Optional, Tuple, Union
+from schema.agent_outputs import Action, MultiAction, Finish, Error, Observation
 from langchain_core.messages import AIMessage
 from tools.tools import get_tools
-from llm_utils.stop_sequences import remove_stop_sequences
+from llm_utils.stop_sequences import StopSequenceFilter, remove_stop_sequences
 import json
-from graph.utils import send_event
 
 
 def plan_parser(ai_message: AIMessage) -> list[str]:
     return ai_message.content.strip()
 
 
-def react_parser(ai_message: AIMessage) -> Union[Action, Finish, Error]:
+def react_parser(ai_message: AIMessage) -> Union[Action, MultiAction, Finish, Error]:
     log = ai_message.content
     text = remove_stop_sequences(log)
 
@@ -23,31 +22,50 @@ def react_parser(ai_message: AIMessage) -> Union[Action, Finish, Error]:
     )
     react_match = re.search(react_regex, text, re.DOTALL)
     if react_match:
+        # Independent actions can be written one after the other, each with its Action and Action Input
+        pairs = re.split(r"\s*Action\s*:\s*(.*?)\s*Action\s*Input\s*:\s*", react_match.group(3).strip(), flags=re.DOTALL)
+        actions = [react_match.group(2), *pairs[1::2]]
         try:
             thought = react_match.group(1).strip() if react_match.group(1) else ""
 
-            action = react_match.group(2).strip()
-            if action not in tool_names:
-                error = f"Invalid Action `{action}`, must be one of {tool_names}"
-                send_event("error", error)
-                return Error(log=text, error=error)
+            parsed = []
+            for action, action_input in zip(actions, pairs[::2]):
+                action = action.strip()
+                if action not in tool_names:
+                    error = f"Invalid Action `{action}`, must be one of {tool_names}"
+                    return Error(log=text, error=error)
 
-            action_input = json.loads(react_match.group(3).strip())
+                parsed.append((action, json.loads(action_input.strip()), action_input.strip()))
 
             if not thought and text.startswith("Action"):
                 thought = ""
             elif not thought:
                 thought = text.split("Action")[0].strip()
-            return Action(
+            if len(parsed) == 1:
+                action, action_input, _ = parsed[0]
+                return Action(
+                    thought=thought,
+                    action=action,
+                    action_input=action_input,
+                    log=log,
+                    scratchpad=text.strip(),
+                )
+            return MultiAction(
                 thought=thought,
-                action=action,
-                action_input=action_input,
+                actions=[
+                    Action(
+                        thought=thought,
+                        action=action,
+                        action_input=action_input,
+                        scratchpad=f"Action: {action}\nAction Input: {raw_input}",
+                    )
+                    for action, action_input, raw_input in parsed
+                ],
                 log=log,
                 scratchpad=text.strip(),
             )
         except Exception as e:
             error = f"Invalid Action Input for `{action}`, retry the action but resolve the error: < {str(e)} >"
-            send_event("error", error)
             return Error(
                 log=text,
                 error=error,
@@ -70,13 +88,79 @@ def react_parser(ai_message: AIMessage) -> Union[Action, Finish, Error]:
     #     )
 
     # error = f"Could not find a matching [TOOL_CALL_SCHEMA] or [ANSWER_SCHEMA] pattern in the output, please try again."
-    # send_event("error", error)
     # return Error(
     #     log=log,
     #     error=error,
     # )
 
 
+class ActionStreamParser:
+    """
+    Finds the tool call of a ReAct completion while it streams, so the tool can start before the completion ends.
+
+    `feed` returns the action and its input once `Action:` names one of `tool_names` and the `Action Input` JSON object
+    is complete, and None before and after that. It only looks at the first action, like `react_parser`, which still
+    parses the full completion and has the last word.
+    """
+
+    _action_regex = re.compile(r"Action\s*:\s*(.*?)\s*Action\s*Input\s*:\s*(\S)", re.DOTALL)
+
+    def __init__(self, tool_names: Iterable[str]):
+        self.tool_names = set(tool_names)
+        self.done = False
+        self._filter = StopSequenceFilter()
+        self._text = ""
+        self._action: Optional[str] = None
+        # Scan state of the Action Input JSON object, from its opening brace
+        self._start = 0
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, token: str) -> Optional[Tuple[str, dict]]:
+        if self.done:
+            return None
+        self._text += self._filter.feed(token)
+
+        if self._action is None:
+            match = self._action_regex.search(self._text)
+            if not match:
+                return None
+            action = match.group(1).strip()
+            if match.group(2) != "{" or action not in self.tool_names:
+                self.done = True
+                return None
+            self._action = action
+            self._start = self._pos = match.start(2)
+
+        text = self._text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if not self._depth:
+                    self.done = True
+                    try:
+                        action_input = json.loads(text[self._start : i + 1])
+                    except ValueError:
+                        return None
+                    return self._action, action_input
+        self._pos = len(text)
+        return None
+
+
 def observation_parser(ai_message: AIMessage) -> Observation:
     text = ai_message.content
     observation_regex = r"Observation\s*:\s*(.*)$"
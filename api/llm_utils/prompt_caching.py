@@ -0,0 +1,83 @@
+import os
+from typing import Any, Dict, List, Optional
+from langchain_anthropic import ChatAnthropic
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.prompt_values import ChatPromptValue
+from langchain_core.runnables import Runnable, RunnableLambda
+from metrics.metrics import get_metrics
+
+ANTHROPIC_PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+
+
+def anthropic_headers() -> Optional[Dict[str, str]]:
+    """
+    The headers that enable prompt caching on a ChatAnthropic, None if PROMPT_CACHING is false.
+    """
+    if os.getenv("PROMPT_CACHING", "true").lower() != "true":
+        return None
+    return {"anthropic-beta": ANTHROPIC_PROMPT_CACHING_BETA}
+
+
+def mark_prefix_cacheable(prompt: ChatPromptValue) -> List[BaseMessage]:
+    """
+    Mark the end of the system message, the static prefix of the prompts, as an Anthropic prompt cache breakpoint.
+    """
+    messages = prompt.to_messages()
+    if messages and isinstance(messages[0], SystemMessage) and isinstance(messages[0].content, str):
+        block = {"type": "text", "text": messages[0].content, "cache_control": {"type": "ephemeral"}}
+        messages[0] = SystemMessage(content=[block])
+    return messages
+
+
+def with_prompt_caching(prompt: Runnable, llm: Any) -> Runnable:
+    """
+    Add the prompt cache breakpoint to the prompt for Anthropic models with prompt caching enabled.
+
+    OpenAI caches the longest prefix it has seen automatically, the prompts only need to start with their static part.
+    """
+    headers = getattr(llm, "default_headers", None) or {}
+    if isinstance(llm, ChatAnthropic) and ANTHROPIC_PROMPT_CACHING_BETA in headers.get("anthropic-beta", ""):
+        return prompt | RunnableLambda(mark_prefix_cacheable)
+    return prompt
+
+
+class PromptCacheUsage(BaseCallbackHandler):
+    """
+    Counts the input tokens of the model calls of a role, and those read from and written to the prompt cache,
+    in the metrics as `<role>_input_tokens`, `<role>_cache_read_input_tokens` and `<role>_cache_creation_input_tokens`.
+
+    The models stream, their usage is in the `usage_metadata` of the streamed message, which ChatOpenAI only reports
+    with `stream_usage=True`. The input tokens include the cached ones.
+    """
+
+    # Only updates counters, there is no need to run it in an executor
+    run_inline = True
+
+    def __init__(self, role: str):
+        self.role = role
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        usage = {"input_tokens": 0, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        for generations in response.generations:
+            for generation in generations:
+                usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                usage["input_tokens"] += usage_metadata.get("input_tokens", 0)
+                details = usage_metadata.get("input_token_details") or {}
+                usage["cache_read_input_tokens"] += details.get("cache_read") or 0
+                usage["cache_creation_input_tokens"] += details.get("cache_creation") or 0
+
+        if not usage["cache_read_input_tokens"] and not usage["cache_creation_input_tokens"]:
+            llm_output = response.llm_output or {}
+            # Anthropic reports the cache tokens next to the input tokens, OpenAI as details of the prompt tokens
+            anthropic_usage = llm_output.get("usage") or {}
+            openai_details = (llm_output.get("token_usage") or {}).get("prompt_tokens_details") or {}
+            usage["cache_read_input_tokens"] = (
+                anthropic_usage.get("cache_read_input_tokens") or openai_details.get("cached_tokens") or 0
+            )
+            usage["cache_creation_input_tokens"] = anthropic_usage.get("cache_creation_input_tokens") or 0
+
+        for name, tokens in usage.items():
+            if tokens:
+                get_metrics().increment(f"{self.role}_{name}", tokens)
@@ -1,11 +1,16 @@
-from langchain_core.prompts import PromptTemplate
+from langchain_core.prompts import ChatPromptTemplate
 
 
 class Prompts:
 
-    Planning = PromptTemplate(
-        input_variables=["input", "messages"],
-        template="""
+    # Each prompt starts with a static system message (instructions, tools and schemas) that providers can cache,
+    # the conversation, plan and workspace that change on every call come after it
+
+    Planning = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                """
 You are a helpful AI Planning Agent designed provide the high level plan for a Human to complete a task.
 You will be provided a set of [TOOLS] that the Human can use to complete the task.
 Each step of the plan should involve a tool call from the [TOOLS] provided, a reference to the previous conversation or a response to the user.
@@ -23,7 +28,11 @@ Do NOT include the input variables in the plan, just a high-level overview of th
 Include only the numbered steps in your answer, no other text.
 Provide as few steps as possible in order to complete the task.
 The final step should be to provide a response to the user's query.
-
+""",
+            ),
+            (
+                "human",
+                """
 Previous conversation:
 {messages}
 
@@ -31,12 +40,15 @@ New user input: {input}
 
 Numbered list of steps:
 """,
+            ),
+        ]
     )
 
-    ReAct = PromptTemplate(
-        input_variables=["input", "scratchpad"],
-        optional_variables=["messages"],
-        template="""
+    ReAct = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                """
 You are a helpful AI Agent designed to complete tasks to aid the Humans.
 You will be provided a set of [TOOLS], a [CONVERSATION_HISTORY], a [PLAN], and a [WORKSPACE].
 You must use the tools provided in the workspace to complete the task and answer the `User`.
@@ -59,6 +71,17 @@ STOP
 
 Be sure to add STOP after the Action Input to indicate the end of the tool call.
 
+If several tool calls are independent of each other (none of them needs the result of another), make them all at once by writing one Action and Action Input after the other, as shown in the [MULTI_TOOL_CALL_SCHEMA] below. They run at the same time and you get one Observation for all of them:
+
+[MULTI_TOOL_CALL_SCHEMA]
+Thought: (justification and reasoning for your choice of tools)
+Action: (the name of the first tool to call)
+Action Input: (the arguments to the first tool call in JSON format)
+Action: (the name of the second tool to call)
+Action Input: (the arguments to the second tool call in JSON format)
+STOP
+[/MULTI_TOOL_CALL_SCHEMA]
+
 The result of the tool call will be provided to you as an `"Observation: <result of the tool call>"`.
 
 If there is an error, either in the result of the tool call or in the way the schema is used, the error will be provided to you as an `"Error: <error message>"`.
@@ -70,8 +93,11 @@ If you'd like to send a message to the user from the [WORKSPACE] you must write:
 Agent: (the message to send to the user. Include the reason for your answer)
 STOP
 [/RESPONSE_SCHEMA]
-
-
+""",
+            ),
+            (
+                "human",
+                """
 Begin!
 
 [CONVERSATION_HISTORY]
@@ -88,16 +114,21 @@ Complete ALL of the following steps of the [PLAN] BEFORE you answer the user's q
 [WORKSPACE]
 {scratchpad}
 """,
+            ),
+        ]
     )
 
-    Observer = PromptTemplate(
-        input_variables=["thought", "action", "action_input", "tool_output"],
-        template="""
+    Observer = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                """
 You are a helpful AI Agent working in the context of a Thought, Action, Observation chain. 
 A Thought and Action have been already created.
 A tool has been used to process the action input.
 Your task is to analyse the tool output and produce one observation summarizing the output of the tool invocation. 
 If the tool output includes an error, suggest how to fix the error.
+If several actions were executed at once, the output of each action is given, produce one observation summarizing all of them.
 
 [OUTPUT_SCHEMA]
 Thought: (the reasoning behind the action selection, may include the desired output of the tool)
@@ -130,8 +161,11 @@ Calculator to convert all rice types; long and round short Jasmine rice, Basmati
 However, it’s important to note that brown rice and wild rice have slightly different serving sizes due to their higher fiber content and different cooking characteristics. A serving size of cooked brown rice is also around 1/2 cup or 90 grams. Whether you prefer the traditional method of using measuring cups or the more precise approach of weighing the rice, both techniques will help you control portion sizes and achieve your desired serving size. Weighing rice allows you to achieve precise serving sizes, especially when you need to be mindful of your carbohydrate intake or want to follow a specific recipe closely.>
 Observation: A grain of rice has a volume of 20-^10 m^3
 [/EXAMPLE_2]
-
-
+""",
+            ),
+            (
+                "human",
+                """
 Begin!
 
 Thought: {thought}
@@ -139,4 +173,6 @@ Action: {action}
 Action Input: {action_input}
 Action Output: < {tool_output} >
 """,
+            ),
+        ]
     )
@@ -1,9 +1,87 @@
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
 STOP_SEQUENCES = ["Observation:", "[/WORKSPACE]", "User:", "STOP", "Error:", "AI:"]
 
 FILTER_SEQUENCES = ["[ANSWER_SCHEMA]"]
 
 
+@lru_cache
+def _automaton(sequences: Tuple[str, ...]):
+    """
+    Build the Aho-Corasick automaton of the sequences: the trie transitions, the failure links, the length of the
+    longest sequence ending at each state and the depth of each state.
+    """
+    goto: List[Dict[str, int]] = [{}]
+    fail = [0]
+    match = [0]
+    depth = [0]
+    for sequence in sequences:
+        state = 0
+        for char in sequence:
+            if char not in goto[state]:
+                goto.append({})
+                fail.append(0)
+                match.append(0)
+                depth.append(depth[state] + 1)
+                goto[state][char] = len(goto) - 1
+            state = goto[state][char]
+        match[state] = max(match[state], len(sequence))
+
+    queue = deque(goto[0].values())
+    while queue:
+        parent = queue.popleft()
+        for char, state in goto[parent].items():
+            queue.append(state)
+            link = fail[parent]
+            while link and char not in goto[link]:
+                link = fail[link]
+            fail[state] = goto[link].get(char, 0)
+            match[state] = max(match[state], match[fail[state]])
+    return goto, fail, match, depth
+
+
+class StopSequenceFilter:
+    """
+    Removes stop and filter sequences from text streamed in chunks, matching every sequence at once with an
+    Aho-Corasick automaton so each character is looked at once however the text is split.
+
+    `feed` returns the text that is safe to send. Text that could still be the start of a sequence, e.g. "Obser"
+    at the end of a chunk, is held back until the next chunk decides it, `flush` returns it at the end of the stream.
+    """
+
+    def __init__(self, sequences: Sequence[str] = (*STOP_SEQUENCES, *FILTER_SEQUENCES)):
+        # While in a state, as many characters as its depth are held back
+        self._goto, self._fail, self._match, self._depth = _automaton(tuple(sequences))
+        self._state = 0
+        self._held: List[str] = []
+
+    def feed(self, chunk: str) -> str:
+        goto, fail, match = self._goto, self._fail, self._match
+        state = self._state
+        text = self._held
+        for char in chunk:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            text.append(char)
+            if match[state]:
+                del text[-match[state] :]
+                state = 0
+
+        self._state = state
+        held = self._depth[state]
+        self._held = text[len(text) - held :] if held else []
+        return "".join(text[: len(text) - held])
+
+    def flush(self) -> str:
+        text = "".join(self._held)
+        self._state = 0
+        self._held = []
+        return text
+
+
 def remove_stop_sequences(text: str):
-    for seq in STOP_SEQUENCES + FILTER_SEQUENCES:
-        text = text.replace(seq, "")
-    return text
+    stop_filter = StopSequenceFilter()
+    return stop_filter.feed(text) + stop_filter.flush()
@@ -1,15 +1,24 @@
 import logging, os
 from dotenv import load_dotenv
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, BackgroundTasks, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from langchain_core.runnables import Runnable
-from llm_utils.stop_sequences import STOP_SEQUENCES, remove_stop_sequences
 from schema.api_schema import AgentRequest
 from graph.graph_builder import GraphBuilder
-from tools.tools import get_tools
+from graph.retention import start_compaction
+from graph.utils import adrain_events, flush_checkpointer, arecord_cancellation
+from graph.thread_locks import ThreadLocks, ThreadBusyError, RunCancelledError
+from streaming.coalescer import TokenCoalescer
+from streaming.callbacks import StreamCallbackHandler
+from tools.tools import get_tools, refresh_tools
+from milvus.milvus import close_milvus
+from metrics.metrics import get_metrics
+from llm_utils.prompt_caching import anthropic_headers
 from fastapi.responses import StreamingResponse
 import json
+import asyncio
+import time
 from langchain_anthropic import ChatAnthropic
 from langchain_openai import ChatOpenAI
 
@@ -17,6 +26,12 @@ logging.basicConfig(level=logging.ERROR, format="%(message)s")
 
 load_dotenv()
 
+# Seconds between checks for a disconnected /stream_agent client while the agent is not producing events
+DISCONNECT_POLL_INTERVAL = 1.0
+
+# Runs cancelled after a disconnect, kept referenced until they have recorded their cancellation
+_cancelled_runs = set()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -24,18 +39,26 @@ async def lifespan(app: FastAPI):
     llm = None
 
     if os.getenv("ANTHROPIC_API_KEY", None):
-        llm = ChatAnthropic(model="claude-3-5-sonnet-20240620", temperature=0)
+        llm = ChatAnthropic(model="claude-3-5-sonnet-20240620", temperature=0, default_headers=anthropic_headers())
 
     elif os.getenv("OPENAI_API_KEY", None):
-        llm = ChatOpenAI(model="gpt-4o")
+        llm = ChatOpenAI(model="gpt-4o", stream_usage=True)
 
     if not llm:
         raise Exception("No API keys specified")
 
+    get_tools()
     app.state.agent = GraphBuilder(llm=llm, verbose=True).build_graph()
+    app.state.thread_locks = ThreadLocks.from_env()
+    compaction = start_compaction(app.state.agent.checkpointer)
 
     yield
 
+    if compaction:
+        compaction.cancel()
+    await flush_checkpointer(app.state.agent.checkpointer)
+    close_milvus()
+
 
 app = FastAPI(lifespan=lifespan)
 
@@ -52,6 +75,10 @@ def get_agent():
     return app.state.agent
 
 
+def get_thread_locks():
+    return app.state.thread_locks
+
+
 @app.get("/")
 async def root():
     return {
@@ -62,111 +89,104 @@ async def root():
             "/docs": "View the interactive API documentation",
             "/agent": "Query the agent with natural language",
             "/stream_agent": "Stream response from the agent with natural language query",
+            "/refresh_tools": "Rebuild the agent toolset, e.g. after the RAG collection is created",
+            "/metrics": "View the counters and model latencies of this worker, e.g. plan cache hits",
         },
         "github": "https://github.ibm.com/TechnologyGarageUKI/watsonx-agent",
     }
 
 
 @app.post("/agent")
-async def agent(body: AgentRequest, agent: Runnable = Depends(get_agent)):
+async def agent(
+    body: AgentRequest,
+    background_tasks: BackgroundTasks,
+    agent: Runnable = Depends(get_agent),
+    thread_locks: ThreadLocks = Depends(get_thread_locks),
+):
     config = {"configurable": {"thread_id": body.thread_id}}
-    return agent.invoke(
-        {
-            "input": body.input,
-        },
-        config,
-    )
+    background_tasks.add_task(flush_checkpointer, agent.checkpointer, body.thread_id)
+    try:
+        async with thread_locks.hold(body.thread_id):
+            return await agent.ainvoke(
+                {
+                    "input": body.input,
+                },
+                config,
+            )
+    except ThreadBusyError:
+        raise HTTPException(status_code=409, detail=f"Thread {body.thread_id} already has a run in progress")
+    except RunCancelledError:
+        raise HTTPException(status_code=409, detail=f"Run cancelled by a newer request on thread {body.thread_id}")
 
 
 @app.post("/stream_agent")
-async def stream_agent(body: AgentRequest, agent: Runnable = Depends(get_agent)):
+async def stream_agent(
+    request: Request,
+    body: AgentRequest,
+    agent: Runnable = Depends(get_agent),
+    thread_locks: ThreadLocks = Depends(get_thread_locks),
+):
     config = {"configurable": {"thread_id": body.thread_id}}
+    events = asyncio.Queue()
+    disconnected = asyncio.Event()
+
+    async def run_agent():
+        """
+        Runs the graph in its own task, so a client disconnect can cancel it and it can still record the
+        cancellation and flush its checkpoints after the response itself has been cancelled.
+        """
+        try:
+            async with thread_locks.hold(body.thread_id):
+                try:
+                    await agent.ainvoke({"input": body.input}, {**config, "callbacks": [StreamCallbackHandler(events.put_nowait)]})
+                except Exception as e:
+                    logging.error(f"Exception in event generator: {e}")
+                    events.put_nowait({"type": "error", "error": str(e)})
+                except asyncio.CancelledError:
+                    if disconnected.is_set():
+                        await arecord_cancellation(agent, config, "Run cancelled: the client disconnected.")
+                    raise
+        except ThreadBusyError:
+            events.put_nowait({"type": "error", "error": f"Thread {body.thread_id} already has a run in progress"})
+        except RunCancelledError:
+            events.put_nowait({"type": "error", "error": "Run cancelled by a newer request on this thread"})
+        finally:
+            await adrain_events()
+            events.put_nowait(None)
+            await flush_checkpointer(agent.checkpointer, body.thread_id)
 
     async def event_generator():
+        run = asyncio.create_task(run_agent())
+        coalescer = TokenCoalescer.from_env()
+        finished = False
         try:
-            buffer = ""
-            async for event in agent.astream_events(
-                {"input": body.input},
-                config=config,
-                version="v2",
-            ):
-                kind = event["event"]
-                tags = event.get("tags", [])
-                if kind == "on_chat_model_stream" and "agent" in tags:
-                    content = event["data"]["chunk"].content
-                    buffer += content
-                    if all(content not in seq for seq in STOP_SEQUENCES):
-                        yield json.dumps(
-                            {
-                                "type": "agent",
-                                "content": remove_stop_sequences(buffer),
-                                "message_id": event["run_id"],
-                            }
-                        ) + "\n"
-                        buffer = ""
-                elif kind == "on_chat_model_stream" and "observer" in tags:
-                    content = event["data"]["chunk"].content
-                    yield json.dumps(
-                        {
-                            "type": "observer",
-                            "content": content,
-                            "message_id": event["run_id"],
-                        }
-                    ) + "\n"
-                elif kind == "on_chat_model_stream" and "planner" in tags:
-                    content = event["data"]["chunk"].content
-
-                    yield json.dumps(
-                        {
-                            "type": "planner",
-                            "content": content,
-                            "message_id": event["run_id"],
-                        }
-                    ) + "\n"
-
-                elif kind == "on_tool_start":
-                    tool_input = event["data"].get("input")
-                    if tool_input:
-                        yield json.dumps(
-                            {
-                                "type": "tool_start",
-                                "tool_id": event["run_id"],
-                                "tool_name": event["name"],
-                                "input": tool_input,
-                            }
-                        ) + "\n"
-
-                elif kind == "on_tool_end":
-                    tool_output = event["data"].get("output")
-                    yield json.dumps(
-                        {
-                            "type": "tool_end",
-                            "tool_id": event["run_id"],
-                            "tool_name": event["name"],
-                            "output": tool_output,
-                        }
-                    ) + "\n"
-
-                elif kind == "on_custom_event":
-                    if event["name"] == "error":
-                        error = event["data"]
-                        yield json.dumps(
-                            {
-                                "type": "error",
-                                "error": error,
-                            }
-                        ) + "\n"
-                    if event["name"] == "tool_error":
-                        tool_error = event["data"]
-                        yield json.dumps(
-                            {
-                                "type": "tool_error",
-                                "error": tool_error,
-                            }
-                        ) + "\n"
-        except Exception as e:
-            logging.error(f"Exception in event generator: {e}")
-            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+            while True:
+                deadline = coalescer.deadline
+                timeout = DISCONNECT_POLL_INTERVAL if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout)
+                except asyncio.TimeoutError:
+                    if deadline is not None:
+                        for line in coalescer.flush():
+                            yield line
+                    elif await request.is_disconnected():
+                        return
+                    continue
+                if event is None:
+                    for line in coalescer.flush():
+                        yield line
+                    finished = True
+                    return
+                for line in coalescer.add(event):
+                    yield line
+        finally:
+            # Reached before the run finished only if the client went away, either noticed above
+            # or by the response being cancelled
+            if not finished:
+                disconnected.set()
+                run.cancel()
+                _cancelled_runs.add(run)
+                run.add_done_callback(_cancelled_runs.discard)
 
     return StreamingResponse(event_generator(), media_type="application/json")
 
@@ -175,3 +195,14 @@ async def stream_agent(body: AgentRequest, agent: Runnable = Depends(get_agent))
 async def get_tool_descriptions():
     tools = get_tools()
     return tools.json
+
+
+@app.post("/refresh_tools")
+def refresh_tool_descriptions():
+    tools = refresh_tools()
+    return tools.json
+
+
+@app.get("/metrics")
+async def metrics():
+    return get_metrics().snapshot()
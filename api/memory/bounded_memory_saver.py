@@ -0,0 +1,186 @@
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langchain_core.runnables import RunnableConfig
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict, defaultdict
+import hashlib
+import logging
+import os
+import pickle
+import threading
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    A `MemorySaver` with a budget on the number of threads and the bytes of serialized checkpoints it keeps in
+    memory. When over budget the least recently used threads are evicted, and written to `spill_dir` if set so
+    they are loaded back the next time they are used. Without a `spill_dir` evicted threads are dropped.
+
+    Listing checkpoints without a thread_id only covers the threads currently in memory.
+    """
+
+    def __init__(
+        self,
+        max_threads: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        super().__init__()
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        # thread_id -> serialized bytes held in memory, in least to most recently used order
+        self._thread_bytes: OrderedDict[str, int] = OrderedDict()
+        # thread_id -> keys of `self.writes` belonging to the thread, so evicting a thread does not scan all writes
+        self._thread_writes: defaultdict[str, set] = defaultdict(set)
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with self._lock:
+            if not self._use(config["configurable"]["thread_id"], create=False):
+                return None
+            return super().get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        # Read everything under the lock, an eviction while the caller iterates would change the dicts being read
+        with self._lock:
+            if config and not self._use(config["configurable"]["thread_id"], create=False):
+                return
+            checkpoints = [*super().list(config, filter=filter, before=before, limit=limit)]
+        yield from checkpoints
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            self._use(thread_id)
+            replaced = self.storage[thread_id][checkpoint_ns].get(checkpoint["id"])
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            saved = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            self._resize(thread_id, self._size(saved) - (self._size(replaced) if replaced else 0))
+            self._evict()
+            return next_config
+
+    def put_writes(self, config: RunnableConfig, writes: List[Tuple[str, Any]], task_id: str) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (thread_id, config["configurable"]["checkpoint_ns"], config["configurable"]["checkpoint_id"])
+        with self._lock:
+            self._use(thread_id)
+            before = self._writes_size(outer_key)
+            super().put_writes(config, writes, task_id)
+            self._thread_writes[thread_id].add(outer_key)
+            self._resize(thread_id, self._writes_size(outer_key) - before)
+            self._evict()
+
+    @staticmethod
+    def _size(saved: tuple) -> int:
+        checkpoint, metadata, _ = saved
+        return len(checkpoint[1]) + len(metadata[1])
+
+    def _writes_size(self, outer_key: tuple) -> int:
+        if outer_key not in self.writes:
+            return 0
+        return sum(len(value[1]) for _, _, value in self.writes[outer_key].values())
+
+    def _resize(self, thread_id: str, delta: int):
+        self._thread_bytes[thread_id] += delta
+        self._total_bytes += delta
+
+    def _use(self, thread_id: str, create: bool = True) -> bool:
+        """
+        Mark the thread as most recently used, loading it back from the spill directory if it was evicted.
+        Reads pass `create=False`, so a thread without checkpoints is not tracked: False is returned instead.
+        """
+        if thread_id in self._thread_bytes:
+            self._thread_bytes.move_to_end(thread_id)
+        elif self._load(thread_id):
+            # The reloaded thread can put the saver over budget
+            self._evict()
+        elif create:
+            self._thread_bytes[thread_id] = 0
+        else:
+            return False
+        return True
+
+    def _over_budget(self) -> bool:
+        return (self.max_threads is not None and len(self._thread_bytes) > self.max_threads) or (
+            self.max_bytes is not None and self._total_bytes > self.max_bytes
+        )
+
+    def _evict(self):
+        # Never evict the most recently used thread, it is the one being read or written
+        while len(self._thread_bytes) > 1 and self._over_budget():
+            thread_id, size = self._thread_bytes.popitem(last=False)
+            self._total_bytes -= size
+            storage = self.storage.pop(thread_id, {})
+            # Reads also leave empty entries in the `writes` defaultdict for the checkpoints they look at
+            keys = self._thread_writes.pop(thread_id, set()) | {
+                (thread_id, checkpoint_ns, checkpoint_id)
+                for checkpoint_ns, checkpoints in storage.items()
+                for checkpoint_id in checkpoints
+            }
+            writes = {key: writes for key in keys if (writes := self.writes.pop(key, None))}
+            if self.spill_dir and (storage or writes):
+                self._spill(thread_id, storage, writes)
+
+    def _spill_path(self, thread_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{hashlib.sha256(thread_id.encode()).hexdigest()}.pkl")
+
+    def _spill(self, thread_id: str, storage: dict, writes: dict):
+        try:
+            with open(self._spill_path(thread_id), "wb") as f:
+                pickle.dump(
+                    {
+                        "thread_id": thread_id,
+                        "storage": {ns: dict(checkpoints) for ns, checkpoints in storage.items()},
+                        "writes": writes,
+                    },
+                    f,
+                )
+        except OSError as e:
+            logging.error(f"Failed to spill checkpoints of thread {thread_id}: {e}")
+
+    def _load(self, thread_id: str) -> bool:
+        """
+        Load the thread back from the spill directory, returns whether it was spilled.
+        """
+        if not self.spill_dir:
+            return False
+        path = self._spill_path(thread_id)
+        try:
+            with open(path, "rb") as f:
+                spilled = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, pickle.UnpicklingError) as e:
+            logging.error(f"Failed to load spilled checkpoints of thread {thread_id}: {e}")
+            return False
+
+        self._thread_bytes[thread_id] = 0
+        size = 0
+        for checkpoint_ns, checkpoints in spilled["storage"].items():
+            self.storage[thread_id][checkpoint_ns].update(checkpoints)
+            size += sum(self._size(saved) for saved in checkpoints.values())
+        for outer_key, writes in spilled["writes"].items():
+            self.writes[outer_key].update(writes)
+            self._thread_writes[thread_id].add(outer_key)
+            size += self._writes_size(outer_key)
+        self._resize(thread_id, size)
+        os.remove(path)
+        return True
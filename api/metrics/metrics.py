@@ -0,0 +1,49 @@
+import threading
+from collections import Counter, deque
+from typing import Any, Deque, Dict
+
+
+class Metrics:
+    """
+    Counters and latencies of the agent served on `/metrics`, e.g. plan cache hits. They are per worker and reset on restart.
+
+    Latency percentiles are computed over the last `window` observations of each name.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self._counters[f"{name}_count"] += 1
+            self._latencies.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot: Dict[str, Any] = dict(self._counters)
+            for name, latencies in self._latencies.items():
+                ordered = sorted(latencies)
+                snapshot[name] = {
+                    "mean": sum(ordered) / len(ordered),
+                    "p50": ordered[len(ordered) // 2],
+                    "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                    "max": ordered[-1],
+                }
+            return snapshot
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """
+    Get the shared metrics of the process.
+    """
+    return _metrics
@@ -2,14 +2,59 @@ import os
 from dotenv import load_dotenv
 from pymilvus import MilvusClient, utility, connections, FieldSchema, CollectionSchema
 from fastapi import HTTPException
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
 from langchain_huggingface import HuggingFaceEmbeddings
 import logging
 import math
+import threading
 
 
 load_dotenv()
 
+_embeddings: Optional[Embeddings] = None
+_milvus: Optional["Milvus"] = None
+_lock = threading.Lock()
+
+
+def get_embeddings() -> Embeddings:
+    """
+    Get the shared embedding model, loading the weights on first use.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                _embeddings = HuggingFaceEmbeddings()
+    return _embeddings
+
+
+def get_milvus(cert_path: str = "certs/cert.pem") -> "Milvus":
+    """
+    Get the shared Milvus handle, connecting on first use.
+
+    The underlying gRPC channel is thread-safe and multiplexes concurrent requests,
+    so a single handle serves every RAG lookup in the process.
+    """
+    global _milvus
+    if _milvus is None:
+        embeddings = get_embeddings()
+        with _lock:
+            if _milvus is None:
+                _milvus = Milvus(cert_path=cert_path, embeddings=embeddings)
+    return _milvus
+
+
+def close_milvus():
+    """
+    Close the shared Milvus handle, if one was opened.
+    """
+    global _milvus
+    with _lock:
+        if _milvus is not None:
+            _milvus.close()
+            _milvus = None
+
 
 class Milvus:
     def __init__(
@@ -23,6 +68,7 @@ class Milvus:
         server_name: str = "localhost",
         embedding_model_id: str = "ibm/slate-125m-english-rtrvr",
         timeout: int = 10,
+        embeddings: Optional[Embeddings] = None,
     ):
         self.host = host
         self.port = port
@@ -36,7 +82,7 @@ class Milvus:
         self._connect()
         self.client = self._get_milvus_client()
         self.embedding_model_id = embedding_model_id
-        self.embeddings = HuggingFaceEmbeddings()
+        self.embeddings = embeddings or HuggingFaceEmbeddings()
 
     def _get_milvus_client(self):
         client = MilvusClient(
@@ -57,6 +103,13 @@ class Milvus:
             server_pem_path=self.server_pem_path,
         )
 
+    def close(self):
+        try:
+            self.client.close()
+            connections.disconnect("default")
+        except Exception as e:
+            logging.error(f"Error closing Milvus connection: {e}")
+
     def create_collection(
         self,
         collection_name: str,
@@ -1,7 +1,9 @@
-from pymongo import MongoClient, UpdateOne
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
+from pymongo.errors import PyMongoError
 from pymongo.database import Database as MongoDatabase
 from langgraph.checkpoint.base import (
     BaseCheckpointSaver,
+    ChannelProtocol,
     ChannelVersions,
     Checkpoint,
     CheckpointMetadata,
@@ -9,8 +11,116 @@ from langgraph.checkpoint.base import (
     get_checkpoint_id,
 )
 from langchain_core.runnables import RunnableConfig
-from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple, Iterator
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Iterator
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+from graph.retention import RetentionPolicy
+import logging
+import random
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIONS = (None, "zlib", "zstd")
+
+
+def compress(data: bytes, compression: Optional[str]) -> bytes:
+    if compression == "zlib":
+        return zlib.compress(data)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def decompress(data: bytes, compression: Optional[str]) -> bytes:
+    if compression == "zlib":
+        return zlib.decompress(data)
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def native_metadata(metadata: CheckpointMetadata) -> Dict[str, Any]:
+    """
+    The metadata values that can be stored as plain BSON, so `list` filters can query and index them.
+    The full metadata is still stored serialized, node writes and non-BSON values are only kept there.
+    """
+    return {key: value for key, value in metadata.items() if key != "writes" and _is_native(value)}
+
+
+def _upgrade_versions(checkpoint: Checkpoint) -> Checkpoint:
+    """
+    Checkpoints written before channel versions were strings have int versions, which do not compare with
+    the versions of `MongoDBSaver.get_next_version`. Turn them into strings of the same order.
+    """
+    checkpoint["channel_versions"] = {
+        channel: _upgrade_version(version) for channel, version in checkpoint["channel_versions"].items()
+    }
+    checkpoint["versions_seen"] = {
+        node: {channel: _upgrade_version(version) for channel, version in versions.items()}
+        for node, versions in checkpoint["versions_seen"].items()
+    }
+    return checkpoint
+
+
+def _upgrade_version(version: Any) -> Any:
+    return f"{version:032}" if isinstance(version, int) else version
+
+
+def _is_upgraded_version(version: Any) -> bool:
+    return isinstance(version, str) and "." not in version
+
+
+def _is_native(value: Any) -> bool:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_is_native(item) for item in value)
+    if isinstance(value, dict):
+        return all(
+            isinstance(key, str) and "." not in key and not key.startswith("$") and _is_native(item)
+            for key, item in value.items()
+        )
+    return False
+
+
+# Checkpoints loaded per query for their channel values, when listing
+BLOBS_BATCH_SIZE = 100
+
+
+def blobs_query(docs: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    The query for the channel values of the delta encoded checkpoints among `docs`, None if there are none.
+    Each clause matches every field of the thread_channel_version index, so the values are read from the index.
+    """
+    keys = {
+        (doc["thread_id"], doc["checkpoint_ns"], channel, version)
+        for doc in docs
+        if doc.get("delta")
+        for channel, version in doc["blob_versions"]
+    }
+    if not keys:
+        return None
+    return {
+        "$or": [
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "channel": channel, "version": version}
+            for thread_id, checkpoint_ns, channel, version in keys
+        ]
+    }
+
+
+def attach_blobs(docs: List[Dict[str, Any]], blobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    by_key = {(blob["thread_id"], blob["checkpoint_ns"], blob["channel"], blob["version"]): blob for blob in blobs}
+    for doc in docs:
+        if doc.get("delta"):
+            keys = [(doc["thread_id"], doc["checkpoint_ns"], *blob_version) for blob_version in doc["blob_versions"]]
+            doc["blobs"] = [by_key[key] for key in keys if key in by_key]
+    return docs
 
 
 class MongoDBSaver(BaseCheckpointSaver):
@@ -20,14 +130,133 @@ class MongoDBSaver(BaseCheckpointSaver):
     async_client: AsyncIOMotorClient
     async_db: AsyncIOMotorDatabase
 
-    def __init__(self, host: str, port: int, db_name: str) -> None:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        db_name: str,
+        background_indexes: bool = False,
+        retention: Optional[RetentionPolicy] = None,
+        metadata_indexes: Sequence[str] = ("step", "source"),
+        delta: bool = False,
+        compression: Optional[str] = None,
+    ) -> None:
+        """
+        delta: store each channel value once per version in `checkpoint_blobs`, so a checkpoint only writes the
+            channels that changed instead of the whole state.
+        compression: compress serialized checkpoints, channel values and writes with "zlib" or "zstd".
+        """
         super().__init__()
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unsupported checkpoint compression `{compression}`, must be one of {COMPRESSIONS}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd checkpoint compression requires the `zstandard` package")
+        self.retention = retention or RetentionPolicy()
+        self.metadata_indexes = metadata_indexes
+        self.delta = delta
+        self.compression = compression
+        # Threads whose latest checkpoint is known to be delta encoded, see `_unknown_parent_query`
+        self._delta_threads: OrderedDict = OrderedDict()
+        self._delta_threads_lock = threading.Lock()
+        # Start of the last compaction, see `compact`
+        self._compacted_at: Optional[datetime] = None
         self.sync_client = MongoClient(host=host, port=port)
         self.sync_db = self.sync_client[db_name]
         self.async_client = AsyncIOMotorClient(host=host, port=port)
         self.async_db = self.async_client[db_name]
+        if background_indexes:
+            threading.Thread(target=self.ensure_indexes, kwargs={"background": True}, daemon=True).start()
+        else:
+            self.ensure_indexes()
+
+    def ensure_indexes(self, background: bool = False) -> None:
+        """
+        Create the indexes backing the checkpoint reads and upserts, if they do not already exist.
+        """
+        try:
+            self.sync_db["checkpoints"].create_index(
+                [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", DESCENDING)],
+                name="thread_checkpoint",
+                unique=True,
+                background=background,
+            )
+            self.sync_db["checkpoint_writes"].create_index(
+                [
+                    ("thread_id", ASCENDING),
+                    ("checkpoint_ns", ASCENDING),
+                    ("checkpoint_id", ASCENDING),
+                    ("task_id", ASCENDING),
+                    ("idx", ASCENDING),
+                ],
+                name="thread_checkpoint_write",
+                unique=True,
+                background=background,
+            )
+            self.sync_db["checkpoint_blobs"].create_index(
+                [
+                    ("thread_id", ASCENDING),
+                    ("checkpoint_ns", ASCENDING),
+                    ("channel", ASCENDING),
+                    ("version", ASCENDING),
+                ],
+                name="thread_channel_version",
+                unique=True,
+                background=background,
+            )
+            # Lets the retention methods read the latest update of each thread without scanning the collection
+            self.sync_db["checkpoints"].create_index(
+                [("thread_id", ASCENDING), ("updated_at", DESCENDING)],
+                name="thread_updated",
+                background=background,
+            )
+            for key in self.metadata_indexes:
+                # `list` filters on metadata within a thread, sorted by checkpoint_id
+                self.sync_db["checkpoints"].create_index(
+                    [
+                        ("thread_id", ASCENDING),
+                        ("checkpoint_ns", ASCENDING),
+                        (f"metadata_fields.{key}", ASCENDING),
+                        ("checkpoint_id", DESCENDING),
+                    ],
+                    name=f"thread_metadata_{key}",
+                    background=background,
+                )
+        except PyMongoError as e:
+            logging.error(f"Failed to create MongoDB checkpoint indexes: {e}")
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        """
+        Versions get a random suffix, like those of MemorySaver, so the branches forked from a checkpoint never
+        give a channel the same version, which would make them share (and overwrite) its value in `checkpoint_blobs`.
+        """
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
 
     def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        for doc in self._with_blobs(list(self.sync_db["checkpoints"].aggregate(self._get_tuple_pipeline(config)))):
+            return self._load_tuple(doc)
+
+    def _with_blobs(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Add the channel values of the delta encoded checkpoints among `docs`, in a second query only if there are any.
+        """
+        query = blobs_query(docs)
+        return attach_blobs(docs, list(self.sync_db["checkpoint_blobs"].find(query))) if query else docs
+
+    async def _awith_blobs(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        query = blobs_query(docs)
+        return attach_blobs(docs, await self.async_db["checkpoint_blobs"].find(query).to_list(None)) if query else docs
+
+    def _get_tuple_pipeline(self, config: RunnableConfig) -> List[Dict[str, Any]]:
+        """
+        Build the aggregation returning the requested (or latest) checkpoint joined with its pending writes,
+        so a checkpoint load is a single round trip.
+        """
         thread_id = str(config["configurable"]["thread_id"])  # Ensure thread_id is a string
         checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
         if checkpoint_id := get_checkpoint_id(config):
@@ -39,40 +268,75 @@ class MongoDBSaver(BaseCheckpointSaver):
         else:
             query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
 
-        result = self.sync_db["checkpoints"].find(query).sort("checkpoint_id", -1).limit(1)
-        for doc in result:
-            config_values = {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": doc["checkpoint_id"],
-            }
-            checkpoint = self.serde.loads_typed((doc["type"], doc["checkpoint"]))
-            serialized_writes = self.sync_db["checkpoint_writes"].find(config_values)
-            pending_writes = [
+        return [
+            {"$match": query},
+            {"$sort": {"checkpoint_id": -1}},
+            {"$limit": 1},
+            {
+                "$lookup": {
+                    "from": "checkpoint_writes",
+                    "let": {
+                        "thread_id": "$thread_id",
+                        "checkpoint_ns": "$checkpoint_ns",
+                        "checkpoint_id": "$checkpoint_id",
+                    },
+                    "pipeline": [
+                        {
+                            "$match": {
+                                "$expr": {
+                                    "$and": [
+                                        {"$eq": ["$thread_id", "$$thread_id"]},
+                                        {"$eq": ["$checkpoint_ns", "$$checkpoint_ns"]},
+                                        {"$eq": ["$checkpoint_id", "$$checkpoint_id"]},
+                                    ]
+                                }
+                            }
+                        },
+                        {"$sort": {"task_id": 1, "idx": 1}},
+                    ],
+                    "as": "pending_writes",
+                }
+            },
+        ]
+
+    def _load_tuple(self, doc: Dict[str, Any]) -> CheckpointTuple:
+        config_values = {
+            "thread_id": doc["thread_id"],
+            "checkpoint_ns": doc["checkpoint_ns"],
+            "checkpoint_id": doc["checkpoint_id"],
+        }
+        checkpoint = _upgrade_versions(self._loads(doc, "checkpoint"))
+        if doc.get("delta"):
+            checkpoint["channel_values"] = {blob["channel"]: self._loads(blob) for blob in doc["blobs"]}
+        pending_writes = (
+            [
                 (
-                    doc["task_id"],
-                    doc["channel"],
-                    self.serde.loads_typed((doc["type"], doc["value"])),
+                    write["task_id"],
+                    write["channel"],
+                    self._loads(write),
                 )
-                for doc in serialized_writes
+                for write in doc["pending_writes"]
             ]
-            return CheckpointTuple(
-                {"configurable": config_values},
-                checkpoint,
-                self.serde.loads(doc["metadata"]),
-                (
-                    {
-                        "configurable": {
-                            "thread_id": thread_id,
-                            "checkpoint_ns": checkpoint_ns,
-                            "checkpoint_id": doc["parent_checkpoint_id"],
-                        }
+            if "pending_writes" in doc
+            else None
+        )
+        return CheckpointTuple(
+            {"configurable": config_values},
+            checkpoint,
+            self.serde.loads(doc["metadata"]),
+            (
+                {
+                    "configurable": {
+                        "thread_id": doc["thread_id"],
+                        "checkpoint_ns": doc["checkpoint_ns"],
+                        "checkpoint_id": doc["parent_checkpoint_id"],
                     }
-                    if doc.get("parent_checkpoint_id")
-                    else None
-                ),
-                pending_writes,
-            )
+                }
+                if doc.get("parent_checkpoint_id")
+                else None
+            ),
+            pending_writes,
+        )
 
     def list(
         self,
@@ -82,6 +346,22 @@ class MongoDBSaver(BaseCheckpointSaver):
         before: Optional[RunnableConfig] = None,
         limit: Optional[int] = None,
     ) -> Iterator[CheckpointTuple]:
+        result = self.sync_db["checkpoints"].aggregate(self._list_pipeline(config, filter, before, limit))
+        docs = []
+        for doc in result:
+            docs.append(doc)
+            if len(docs) == BLOBS_BATCH_SIZE:
+                yield from map(self._load_tuple, self._with_blobs(docs))
+                docs = []
+        yield from map(self._load_tuple, self._with_blobs(docs))
+
+    def _list_pipeline(
+        self,
+        config: Optional[RunnableConfig],
+        filter: Optional[Dict[str, Any]],
+        before: Optional[RunnableConfig],
+        limit: Optional[int],
+    ) -> List[Dict[str, Any]]:
         query = {}
         if config is not None:
             query = {
@@ -91,39 +371,15 @@ class MongoDBSaver(BaseCheckpointSaver):
 
         if filter:
             for key, value in filter.items():
-                query[f"metadata.{key}"] = value
+                query[f"metadata_fields.{key}"] = value
 
         if before is not None:
             query["checkpoint_id"] = {"$lt": before["configurable"]["checkpoint_id"]}
 
-        result = self.sync_db["checkpoints"].find(query).sort("checkpoint_id", -1)
-
+        pipeline = [{"$match": query}, {"$sort": {"checkpoint_id": -1}}]
         if limit is not None:
-            result = result.limit(limit)
-        for doc in result:
-            checkpoint = self.serde.loads_typed((doc["type"], doc["checkpoint"]))
-            yield CheckpointTuple(
-                {
-                    "configurable": {
-                        "thread_id": doc["thread_id"],
-                        "checkpoint_ns": doc["checkpoint_ns"],
-                        "checkpoint_id": doc["checkpoint_id"],
-                    }
-                },
-                checkpoint,
-                self.serde.loads(doc["metadata"]),
-                (
-                    {
-                        "configurable": {
-                            "thread_id": doc["thread_id"],
-                            "checkpoint_ns": doc["checkpoint_ns"],
-                            "checkpoint_id": doc["parent_checkpoint_id"],
-                        }
-                    }
-                    if doc.get("parent_checkpoint_id")
-                    else None
-                ),
-            )
+            pipeline.append({"$limit": limit})
+        return pipeline
 
     def put(
         self,
@@ -132,36 +388,87 @@ class MongoDBSaver(BaseCheckpointSaver):
         metadata: CheckpointMetadata,
         new_versions: ChannelVersions,
     ) -> RunnableConfig:
+        full = False
+        if self.delta and (parent_query := self._unknown_parent_query(config)):
+            full = not self._is_delta(self.sync_db["checkpoints"].find_one(parent_query, {"delta": 1}))
+        upsert_query, doc, blob_operations = self._put_operations(config, checkpoint, metadata, new_versions, full)
+        if blob_operations:
+            self.sync_db["checkpoint_blobs"].bulk_write(blob_operations)
+        self.sync_db["checkpoints"].update_one(upsert_query, {"$set": doc}, upsert=True)
+        return {"configurable": upsert_query}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        self.sync_db["checkpoint_writes"].bulk_write(self._write_operations(config, writes, task_id))
+
+    def _put_operations(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+        full: bool = False,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], List[UpdateOne]]:
         thread_id = str(config["configurable"]["thread_id"])  # Ensure thread_id is a string
         checkpoint_ns = config["configurable"]["checkpoint_ns"]
         checkpoint_id = checkpoint["id"]
-        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
-        doc = {
-            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
-            "type": type_,
-            "checkpoint": serialized_checkpoint,
-            "metadata": self.serde.dumps(metadata),
-        }
         upsert_query = {
             "thread_id": thread_id,
             "checkpoint_ns": checkpoint_ns,
             "checkpoint_id": checkpoint_id,
         }
-        self.sync_db["checkpoints"].update_one(upsert_query, {"$set": doc}, upsert=True)
-        return {
-            "configurable": {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": checkpoint_id,
-            }
+        now = datetime.now(timezone.utc)
+        doc = {
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "metadata": self.serde.dumps(metadata),
+            "metadata_fields": native_metadata(metadata),
+            "updated_at": now,
         }
 
-    def put_writes(
+        blob_operations = []
+        if self.delta:
+            channel_values = checkpoint["channel_values"]
+            checkpoint = {**checkpoint, "channel_values": {}}
+            changed = channel_values.keys() if full else new_versions.keys() & channel_values.keys()
+            # Values of upgraded int versions were stored under the int, store them again under the upgraded version
+            upgraded = {
+                channel for channel in channel_values if _is_upgraded_version(checkpoint["channel_versions"][channel])
+            }
+            for channel in changed | upgraded:
+                version = str(checkpoint["channel_versions"][channel])
+                type_, value = self._dumps(channel_values[channel])
+                # Versions are unique, a blob that already exists holds the same value
+                blob_operations.append(
+                    UpdateOne(
+                        {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "channel": channel, "version": version},
+                        {
+                            "$setOnInsert": {
+                                "type": type_,
+                                "value": value,
+                                "compression": self.compression,
+                                "created_at": now,
+                            }
+                        },
+                        upsert=True,
+                    )
+                )
+            doc["delta"] = True
+            doc["blob_versions"] = [[channel, str(version)] for channel, version in checkpoint["channel_versions"].items()]
+
+        doc["type"], doc["checkpoint"] = self._dumps(checkpoint)
+        doc["compression"] = self.compression
+        return upsert_query, doc, blob_operations
+
+    def _write_operations(
         self,
         config: RunnableConfig,
         writes: Sequence[Tuple[str, Any]],
         task_id: str,
-    ) -> None:
+    ) -> List[UpdateOne]:
         thread_id = str(config["configurable"]["thread_id"])  # Ensure thread_id is a string
         checkpoint_ns = config["configurable"]["checkpoint_ns"]
         checkpoint_id = config["configurable"]["checkpoint_id"]
@@ -174,7 +481,7 @@ class MongoDBSaver(BaseCheckpointSaver):
                 "task_id": task_id,
                 "idx": idx,
             }
-            type_, serialized_value = self.serde.dumps_typed(value)
+            type_, serialized_value = self._dumps(value)
             operations.append(
                 UpdateOne(
                     upsert_query,
@@ -183,59 +490,48 @@ class MongoDBSaver(BaseCheckpointSaver):
                             "channel": channel,
                             "type": type_,
                             "value": serialized_value,
+                            "compression": self.compression,
                         }
                     },
                     upsert=True,
                 )
             )
-        self.sync_db["checkpoint_writes"].bulk_write(operations)
+        return operations
 
-    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
-        thread_id = str(config["configurable"]["thread_id"])  # Ensure thread_id is a string
-        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
-        if checkpoint_id := get_checkpoint_id(config):
-            query = {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": checkpoint_id,
-            }
-        else:
-            query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+    def _dumps(self, value: Any) -> Tuple[str, bytes]:
+        type_, serialized = self.serde.dumps_typed(value)
+        return type_, compress(serialized, self.compression)
 
-        result = self.async_db["checkpoints"].find(query).sort("checkpoint_id", -1).limit(1)
-        async for doc in result:
-            config_values = {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": doc["checkpoint_id"],
-            }
-            checkpoint = self.serde.loads_typed((doc["type"], doc["checkpoint"]))
-            serialized_writes = self.async_db["checkpoint_writes"].find(config_values)
-            pending_writes = [
-                (
-                    doc["task_id"],
-                    doc["channel"],
-                    self.serde.loads_typed((doc["type"], doc["value"])),
-                )
-                async for doc in serialized_writes
-            ]
-            return CheckpointTuple(
-                {"configurable": config_values},
-                checkpoint,
-                self.serde.loads(doc["metadata"]),
-                (
-                    {
-                        "configurable": {
-                            "thread_id": thread_id,
-                            "checkpoint_ns": checkpoint_ns,
-                            "checkpoint_id": doc["parent_checkpoint_id"],
-                        }
-                    }
-                    if doc.get("parent_checkpoint_id")
-                    else None
-                ),
-                pending_writes,
-            )
+    def _loads(self, doc: Dict[str, Any], field: str = "value") -> Any:
+        return self.serde.loads_typed((doc["type"], decompress(doc[field], doc.get("compression"))))
+
+    def _unknown_parent_query(self, config: RunnableConfig) -> Optional[Dict[str, Any]]:
+        """
+        A delta checkpoint only stores the channels in `new_versions`, which is only complete if its parent
+        was delta encoded too. Returns the query for the parent checkpoint if that is not yet known for this thread
+        (e.g. the thread was written before delta encoding was enabled), None otherwise.
+        """
+        thread_key = (str(config["configurable"]["thread_id"]), config["configurable"]["checkpoint_ns"])
+        parent_checkpoint_id = config["configurable"].get("checkpoint_id")
+        # put runs in the executor threads of the sync graph, and in the write behind writer
+        with self._delta_threads_lock:
+            known = thread_key in self._delta_threads
+            self._delta_threads[thread_key] = True
+            self._delta_threads.move_to_end(thread_key)
+            if len(self._delta_threads) > 10000:
+                self._delta_threads.popitem(last=False)
+        if known or not parent_checkpoint_id:
+            return None
+        return {"thread_id": thread_key[0], "checkpoint_ns": thread_key[1], "checkpoint_id": parent_checkpoint_id}
+
+    @staticmethod
+    def _is_delta(doc: Optional[Dict[str, Any]]) -> bool:
+        return bool(doc and doc.get("delta"))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        docs = await self.async_db["checkpoints"].aggregate(self._get_tuple_pipeline(config)).to_list(None)
+        for doc in await self._awith_blobs(docs):
+            return self._load_tuple(doc)
         return None
 
     async def alist(
@@ -246,48 +542,16 @@ class MongoDBSaver(BaseCheckpointSaver):
         before: Optional[RunnableConfig] = None,
         limit: Optional[int] = None,
     ) -> AsyncIterator[CheckpointTuple]:
-        query = {}
-        if config is not None:
-            query = {
-                "thread_id": str(config["configurable"]["thread_id"]),  # Ensure thread_id is a string
-                "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
-            }
-
-        if filter:
-            for key, value in filter.items():
-                query[f"metadata.{key}"] = value
-
-        if before is not None:
-            query["checkpoint_id"] = {"$lt": before["configurable"]["checkpoint_id"]}
-
-        result = self.async_db["checkpoints"].find(query).sort("checkpoint_id", -1)
-
-        if limit is not None:
-            result = result.limit(limit)
+        result = self.async_db["checkpoints"].aggregate(self._list_pipeline(config, filter, before, limit))
+        docs = []
         async for doc in result:
-            checkpoint = self.serde.loads_typed((doc["type"], doc["checkpoint"]))
-            yield CheckpointTuple(
-                {
-                    "configurable": {
-                        "thread_id": doc["thread_id"],
-                        "checkpoint_ns": doc["checkpoint_ns"],
-                        "checkpoint_id": doc["checkpoint_id"],
-                    }
-                },
-                checkpoint,
-                self.serde.loads(doc["metadata"]),
-                (
-                    {
-                        "configurable": {
-                            "thread_id": doc["thread_id"],
-                            "checkpoint_ns": doc["checkpoint_ns"],
-                            "checkpoint_id": doc["parent_checkpoint_id"],
-                        }
-                    }
-                    if doc.get("parent_checkpoint_id")
-                    else None
-                ),
-            )
+            docs.append(doc)
+            if len(docs) == BLOBS_BATCH_SIZE:
+                for loaded in await self._awith_blobs(docs):
+                    yield self._load_tuple(loaded)
+                docs = []
+        for loaded in await self._awith_blobs(docs):
+            yield self._load_tuple(loaded)
 
     async def aput(
         self,
@@ -296,29 +560,14 @@ class MongoDBSaver(BaseCheckpointSaver):
         metadata: CheckpointMetadata,
         new_versions: ChannelVersions,
     ) -> RunnableConfig:
-        thread_id = str(config["configurable"]["thread_id"])  # Ensure thread_id is a string
-        checkpoint_ns = config["configurable"]["checkpoint_ns"]
-        checkpoint_id = checkpoint["id"]
-        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
-        doc = {
-            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
-            "type": type_,
-            "checkpoint": serialized_checkpoint,
-            "metadata": self.serde.dumps(metadata),
-        }
-        upsert_query = {
-            "thread_id": thread_id,
-            "checkpoint_ns": checkpoint_ns,
-            "checkpoint_id": checkpoint_id,
-        }
+        full = False
+        if self.delta and (parent_query := self._unknown_parent_query(config)):
+            full = not self._is_delta(await self.async_db["checkpoints"].find_one(parent_query, {"delta": 1}))
+        upsert_query, doc, blob_operations = self._put_operations(config, checkpoint, metadata, new_versions, full)
+        if blob_operations:
+            await self.async_db["checkpoint_blobs"].bulk_write(blob_operations)
         await self.async_db["checkpoints"].update_one(upsert_query, {"$set": doc}, upsert=True)
-        return {
-            "configurable": {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": checkpoint_id,
-            }
-        }
+        return {"configurable": upsert_query}
 
     async def aput_writes(
         self,
@@ -326,30 +575,184 @@ class MongoDBSaver(BaseCheckpointSaver):
         writes: Sequence[Tuple[str, Any]],
         task_id: str,
     ) -> None:
-        thread_id = str(config["configurable"]["thread_id"])  # Ensure thread_id is a string
-        checkpoint_ns = config["configurable"]["checkpoint_ns"]
-        checkpoint_id = config["configurable"]["checkpoint_id"]
-        operations = []
-        for idx, (channel, value) in enumerate(writes):
-            upsert_query = {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": checkpoint_id,
-                "task_id": task_id,
-                "idx": idx,
-            }
-            type_, serialized_value = self.serde.dumps_typed(value)
-            operations.append(
-                UpdateOne(
-                    upsert_query,
-                    {
-                        "$set": {
-                            "channel": channel,
-                            "type": type_,
-                            "value": serialized_value,
-                        }
-                    },
-                    upsert=True,
-                )
+        await self.async_db["checkpoint_writes"].bulk_write(self._write_operations(config, writes, task_id))
+
+    def prune(self, thread_id: str, checkpoint_ns: Optional[str] = None, keep: Optional[int] = None) -> int:
+        """
+        Delete all but the newest `keep` checkpoints of a thread (default: the retention policy's max_checkpoints),
+        along with their writes. Prunes every namespace of the thread unless `checkpoint_ns` is given.
+
+        Returns the number of checkpoints deleted.
+        """
+        keep = keep if keep is not None else self.retention.max_checkpoints
+        if keep is None:
+            return 0
+
+        thread_id = str(thread_id)
+        if checkpoint_ns is None:
+            namespaces = self.sync_db["checkpoints"].distinct("checkpoint_ns", {"thread_id": thread_id})
+        else:
+            namespaces = [checkpoint_ns]
+
+        deleted = 0
+        for ns in namespaces:
+            query = {"thread_id": thread_id, "checkpoint_ns": ns}
+            oldest_kept = list(
+                self.sync_db["checkpoints"]
+                .find(query, {"checkpoint_id": 1})
+                .sort("checkpoint_id", -1)
+                .skip(max(keep - 1, 0))
+                .limit(1)
+            )
+            if not oldest_kept:
+                continue
+            # Checkpoint ids are time ordered, so everything older than the oldest kept checkpoint can go
+            cutoff = {"$lt" if keep > 0 else "$lte": oldest_kept[0]["checkpoint_id"]}
+            deleted += self.sync_db["checkpoints"].delete_many({**query, "checkpoint_id": cutoff}).deleted_count
+            self.sync_db["checkpoint_writes"].delete_many({**query, "checkpoint_id": cutoff})
+            self._delete_unreferenced_blobs(thread_id, ns)
+        return deleted
+
+    def _delete_unreferenced_blobs(self, thread_id: str, checkpoint_ns: str) -> None:
+        """
+        Delete the channel values no checkpoint refers to. `put` writes the values before their checkpoint,
+        so values written within the retention policy's blob_grace_period are kept.
+        """
+        query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        # Read the candidates before the references, so a checkpoint written in between keeps its values
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention.blob_grace_period)
+        candidates = list(
+            self.sync_db["checkpoint_blobs"].find(
+                # Values written before created_at was stored have none
+                {**query, "$or": [{"created_at": {"$lt": cutoff}}, {"created_at": {"$exists": False}}]},
+                {"channel": 1, "version": 1},
             )
-        await self.async_db["checkpoint_writes"].bulk_write(operations)
+        )
+        if not candidates:
+            return
+        referenced = {
+            tuple(blob_version)
+            for doc in self.sync_db["checkpoints"].find({**query, "delta": True}, {"blob_versions": 1})
+            for blob_version in doc["blob_versions"]
+        }
+        unreferenced = [blob["_id"] for blob in candidates if (blob["channel"], blob["version"]) not in referenced]
+        if unreferenced:
+            self.sync_db["checkpoint_blobs"].delete_many({"_id": {"$in": unreferenced}})
+
+    def delete_thread(self, thread_id: str) -> int:
+        """
+        Delete every checkpoint, write and channel value of a thread. Returns the number of checkpoints deleted.
+        """
+        thread_id = str(thread_id)
+        self.sync_db["checkpoint_writes"].delete_many({"thread_id": thread_id})
+        self.sync_db["checkpoint_blobs"].delete_many({"thread_id": thread_id})
+        return self.sync_db["checkpoints"].delete_many({"thread_id": thread_id}).deleted_count
+
+    def backfill_updated_at(self) -> int:
+        """
+        Give the checkpoints written before updated_at was stored, which would never expire, the current time:
+        their threads are idle from now on. A one-off migration, it scans the whole collection.
+
+        Returns the number of checkpoints updated.
+        """
+        return (
+            self.sync_db["checkpoints"]
+            .update_many({"updated_at": {"$exists": False}}, {"$set": {"updated_at": datetime.now(timezone.utc)}})
+            .modified_count
+        )
+
+    def expire_idle_threads(self, ttl: Optional[float] = None) -> int:
+        """
+        Delete threads with no checkpoint written in the last `ttl` seconds (default: the retention policy's thread_ttl).
+
+        Returns the number of threads deleted.
+        """
+        ttl = ttl if ttl is not None else self.retention.thread_ttl
+        if ttl is None:
+            return 0
+
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl)
+        expired = 0
+        for thread in self._thread_updates({"updated_at": {"$lt": cutoff}}):
+            self.delete_thread(thread["_id"])
+            expired += 1
+        return expired
+
+    def _thread_updates(self, match: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        The latest `updated_at` of each thread, optionally filtered by `match`. The sort and $first let MongoDB
+        read a single key per thread from the thread_updated index instead of every checkpoint.
+        """
+        pipeline = [
+            {"$sort": {"thread_id": 1, "updated_at": -1}},
+            {"$group": {"_id": "$thread_id", "updated_at": {"$first": "$updated_at"}}},
+        ]
+        if match:
+            pipeline.append({"$match": match})
+        return self.sync_db["checkpoints"].aggregate(pipeline)
+
+    def delete_orphaned_writes(self) -> int:
+        """
+        Delete writes whose checkpoint no longer exists. Returns the number of writes deleted.
+        """
+        orphans = self.sync_db["checkpoint_writes"].aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": {
+                            "thread_id": "$thread_id",
+                            "checkpoint_ns": "$checkpoint_ns",
+                            "checkpoint_id": "$checkpoint_id",
+                        }
+                    }
+                },
+                {
+                    "$lookup": {
+                        "from": "checkpoints",
+                        "let": {
+                            "thread_id": "$_id.thread_id",
+                            "checkpoint_ns": "$_id.checkpoint_ns",
+                            "checkpoint_id": "$_id.checkpoint_id",
+                        },
+                        "pipeline": [
+                            {
+                                "$match": {
+                                    "$expr": {
+                                        "$and": [
+                                            {"$eq": ["$thread_id", "$$thread_id"]},
+                                            {"$eq": ["$checkpoint_ns", "$$checkpoint_ns"]},
+                                            {"$eq": ["$checkpoint_id", "$$checkpoint_id"]},
+                                        ]
+                                    }
+                                }
+                            },
+                            {"$project": {"_id": 1}},
+                            {"$limit": 1},
+                        ],
+                        "as": "checkpoint",
+                    }
+                },
+                {"$match": {"checkpoint": {"$size": 0}}},
+            ]
+        )
+        deleted = 0
+        for orphan in orphans:
+            deleted += self.sync_db["checkpoint_writes"].delete_many(orphan["_id"]).deleted_count
+        return deleted
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Apply the retention policy to every thread: expire idle threads, prune long threads and delete orphaned writes.
+        """
+        started = datetime.now(timezone.utc)
+        result = {"expired_threads": self.expire_idle_threads(), "pruned_checkpoints": 0}
+
+        if self.retention.max_checkpoints is not None:
+            # Only threads written since the last compaction can have grown past max_checkpoints
+            updated = {"updated_at": {"$gte": self._compacted_at}} if self._compacted_at else None
+            for thread in self._thread_updates(updated):
+                result["pruned_checkpoints"] += self.prune(thread["_id"])
+        self._compacted_at = started
+
+        result["orphaned_writes"] = self.delete_orphaned_writes()
+        return result
@@ -14,6 +14,14 @@ class Action(JsonPlusSerializer):
     log: str = None
 
 
+@dataclass
+class MultiAction(JsonPlusSerializer):
+    thought: str
+    actions: list[Action]
+    scratchpad: str
+    log: str = None
+
+
 @dataclass
 class Observation(JsonPlusSerializer):
     observation: str
@@ -23,6 +31,8 @@ class Observation(JsonPlusSerializer):
 class ToolOutput(JsonPlusSerializer):
     tool_output: str
     log: str = None
+    # Some action of a batch failed, its error is part of the tool output
+    failed: bool = False
 
 @dataclass
 class Finish(JsonPlusSerializer):
@@ -0,0 +1,325 @@
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langchain_core.runnables import RunnableConfig
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+from graph.retention import RetentionPolicy
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE INDEX IF NOT EXISTS checkpoints_thread_updated ON checkpoints (thread_id, updated_at);
+"""
+
+
+class SQLiteSaver(BaseCheckpointSaver):
+    """
+    Checkpoint saver backed by a local SQLite database in WAL mode, for durable threads without a Mongo server.
+
+    Every statement runs on one connection behind a lock, each write is a single transaction. The async methods run
+    the sync ones in a worker thread, so local disk writes do not block the event loop.
+    """
+
+    def __init__(self, path: str, retention: Optional[RetentionPolicy] = None) -> None:
+        super().__init__()
+        self.retention = retention or RetentionPolicy()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Durable on application crashes, a power loss may lose the last transactions but not corrupt the database
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])  # Ensure thread_id is a string
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self._lock:
+            row = self.conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            return self._load_tuple(row, self._pending_writes(row))
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        conditions = []
+        params = []
+        if config is not None:
+            conditions.append("thread_id = ? AND checkpoint_ns = ?")
+            params += [str(config["configurable"]["thread_id"]), config["configurable"].get("checkpoint_ns", "")]
+
+        if filter:
+            for key, value in filter.items():
+                conditions.append("json_extract(metadata, ?) = json_extract(?, '$')")
+                params += [f'$."{key}"', json.dumps(value)]
+
+        if before is not None:
+            conditions.append("checkpoint_id < ?")
+            params.append(before["configurable"]["checkpoint_id"])
+
+        query = "SELECT * FROM checkpoints"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        # Load everything under the lock rather than holding it while the caller iterates
+        with self._lock:
+            tuples = [self._load_tuple(row, self._pending_writes(row)) for row in self.conn.execute(query, params)]
+        yield from tuples
+
+    def _pending_writes(self, row: tuple) -> List[Tuple[str, str, Any]]:
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, value FROM checkpoint_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (row[0], row[1], row[2]),
+        )
+        return [(task_id, channel, self.serde.loads_typed((type_, value))) for task_id, channel, type_, value in writes]
+
+    def _load_tuple(self, row: tuple, pending_writes: List[Tuple[str, str, Any]]) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata, _ = row
+        return CheckpointTuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            self.serde.loads_typed((type_, checkpoint)),
+            self.serde.loads(metadata.encode()),
+            (
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes,
+        )
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])  # Ensure thread_id is a string
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serialized_checkpoint,
+                    self.serde.dumps(metadata).decode(),
+                    time.time(),
+                ),
+            )
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        thread_id = str(config["configurable"]["thread_id"])  # Ensure thread_id is a string
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = [
+            (
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        tuples = await asyncio.to_thread(lambda: [*self.list(config, filter=filter, before=before, limit=limit)])
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id)
+
+    def prune(self, thread_id: str, checkpoint_ns: Optional[str] = None, keep: Optional[int] = None) -> int:
+        """
+        Delete all but the newest `keep` checkpoints of a thread (default: the retention policy's max_checkpoints),
+        along with their writes. Prunes every namespace of the thread unless `checkpoint_ns` is given.
+
+        Returns the number of checkpoints deleted.
+        """
+        keep = keep if keep is not None else self.retention.max_checkpoints
+        if keep is None:
+            return 0
+
+        thread_id = str(thread_id)
+        with self._lock, self.conn:
+            if checkpoint_ns is None:
+                namespaces = [
+                    ns
+                    for (ns,) in self.conn.execute(
+                        "SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (thread_id,)
+                    )
+                ]
+            else:
+                namespaces = [checkpoint_ns]
+
+            deleted = 0
+            for ns in namespaces:
+                # Checkpoint ids are time ordered, so everything but the newest `keep` ids can go
+                kept = "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?1 AND checkpoint_ns = ?2 ORDER BY checkpoint_id DESC LIMIT ?3"
+                deleted += self.conn.execute(
+                    f"DELETE FROM checkpoints WHERE thread_id = ?1 AND checkpoint_ns = ?2 AND checkpoint_id NOT IN ({kept})",
+                    (thread_id, ns, keep),
+                ).rowcount
+                self.conn.execute(
+                    f"DELETE FROM checkpoint_writes WHERE thread_id = ?1 AND checkpoint_ns = ?2 AND checkpoint_id NOT IN ({kept})",
+                    (thread_id, ns, keep),
+                )
+        return deleted
+
+    def delete_thread(self, thread_id: str) -> int:
+        """
+        Delete every checkpoint and write of a thread. Returns the number of checkpoints deleted.
+        """
+        thread_id = str(thread_id)
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM checkpoint_writes WHERE thread_id = ?", (thread_id,))
+            return self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,)).rowcount
+
+    def expire_idle_threads(self, ttl: Optional[float] = None) -> int:
+        """
+        Delete threads with no checkpoint written in the last `ttl` seconds (default: the retention policy's thread_ttl).
+
+        Returns the number of threads deleted.
+        """
+        ttl = ttl if ttl is not None else self.retention.thread_ttl
+        if ttl is None:
+            return 0
+
+        with self._lock:
+            idle_threads = self.conn.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(updated_at) < ?",
+                (time.time() - ttl,),
+            ).fetchall()
+        for (thread_id,) in idle_threads:
+            self.delete_thread(thread_id)
+        return len(idle_threads)
+
+    def delete_orphaned_writes(self) -> int:
+        """
+        Delete writes whose checkpoint no longer exists. Returns the number of writes deleted.
+        """
+        with self._lock, self.conn:
+            return self.conn.execute(
+                "DELETE FROM checkpoint_writes WHERE NOT EXISTS ("
+                "SELECT 1 FROM checkpoints c WHERE c.thread_id = checkpoint_writes.thread_id "
+                "AND c.checkpoint_ns = checkpoint_writes.checkpoint_ns AND c.checkpoint_id = checkpoint_writes.checkpoint_id)"
+            ).rowcount
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Apply the retention policy to every thread: expire idle threads, prune long threads and delete orphaned writes.
+        """
+        result = {"expired_threads": self.expire_idle_threads(), "pruned_checkpoints": 0}
+
+        if self.retention.max_checkpoints is not None:
+            with self._lock:
+                long_threads = self.conn.execute(
+                    "SELECT thread_id, checkpoint_ns FROM checkpoints GROUP BY thread_id, checkpoint_ns HAVING COUNT(*) > ?",
+                    (self.retention.max_checkpoints,),
+                ).fetchall()
+            for thread_id, checkpoint_ns in long_threads:
+                result["pruned_checkpoints"] += self.prune(thread_id, checkpoint_ns)
+
+        result["orphaned_writes"] = self.delete_orphaned_writes()
+        return result
@@ -0,0 +1,91 @@
+from langchain_core.callbacks import AsyncCallbackHandler
+from llm_utils.stop_sequences import StopSequenceFilter
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+STREAMED_TAGS = ("agent", "observer", "planner")
+
+
+class StreamCallbackHandler(AsyncCallbackHandler):
+    """
+    Forwards the events `/stream_agent` sends, the tokens of the agent, observer and planner models,
+    tool starts and ends and the custom error, observer and planner events, to `emit` as stream event dicts.
+
+    Only these callbacks do any work, unlike `astream_events` which builds an event for every step of every runnable.
+    The handler does not make the chat models stream, it only gets tokens from models called with `stream=True`.
+    """
+
+    # Awaited directly rather than through asyncio.gather for every token, emit does not block
+    run_inline = True
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None]):
+        self.emit = emit
+        # Chat model run_id -> the tag of the model it streams, agent tokens go through a filter to strip stop sequences
+        self._models: Dict[UUID, str] = {}
+        self._filters: Dict[UUID, StopSequenceFilter] = {}
+        self._tools: Dict[UUID, str] = {}
+
+    async def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        tags: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        for tag in STREAMED_TAGS:
+            if tags and tag in tags:
+                self._models[run_id] = tag
+                return
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, chunk: Any = None, **kwargs: Any) -> None:
+        tag = self._models.get(run_id)
+        if tag is None:
+            return
+        content = chunk.message.content if chunk is not None else token
+        if tag == "agent":
+            content = self._filters.setdefault(run_id, StopSequenceFilter()).feed(content)
+            if not content:
+                return
+        self.emit({"type": tag, "content": content, "message_id": str(run_id)})
+
+    async def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        tag = self._models.pop(run_id, None)
+        stop_filter = self._filters.pop(run_id, None)
+        # Text held back as the possible start of a stop sequence that never completed
+        content = stop_filter.flush() if stop_filter else ""
+        if content:
+            self.emit({"type": tag, "content": content, "message_id": str(run_id)})
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._models.pop(run_id, None)
+        self._filters.pop(run_id, None)
+
+    async def on_tool_start(
+        self,
+        serialized: Dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        inputs: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = serialized.get("name") or kwargs.get("name")
+        self._tools[run_id] = name
+        tool_input = inputs or input_str
+        if tool_input:
+            self.emit({"type": "tool_start", "tool_id": str(run_id), "tool_name": name, "input": tool_input})
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self.emit({"type": "tool_end", "tool_id": str(run_id), "tool_name": self._tools.pop(run_id, None), "output": output})
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._tools.pop(run_id, None)
+
+    async def on_custom_event(self, name: str, data: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        if name in ("error", "tool_error"):
+            self.emit({"type": name, "error": data})
+        elif name in ("observer", "planner"):
+            # An observation or plan made without a model call, sent like the tokens of the model
+            self.emit({"type": name, "content": data, "message_id": str(run_id)})
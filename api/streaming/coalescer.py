@@ -0,0 +1,76 @@
+import os
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+TOKEN_TYPES = ("agent", "observer", "planner")
+
+
+class TokenCoalescer:
+    """
+    Turns stream events into NDJSON lines, merging consecutive token events of the same message into one line.
+
+    The first token of each message is sent immediately. Later tokens are held until `window` seconds have passed
+    since the first held token, or `max_bytes` of content is held, or any other event has to be sent (events keep
+    their order). Call `flush` when `deadline` has passed, and at the end of the stream.
+    A `window` of 0 sends every token as its own line.
+    """
+
+    def __init__(self, window: float = 0.05, max_bytes: int = 512):
+        self.window = window
+        self.max_bytes = max_bytes
+        self._pending: Optional[Dict[str, Any]] = None
+        self._pending_bytes = 0
+        self._started = 0.0
+        self._seen = set()
+
+    @classmethod
+    def from_env(cls) -> "TokenCoalescer":
+        return cls(
+            window=float(os.getenv("STREAM_COALESCE_WINDOW_MS") or 50) / 1000,
+            max_bytes=int(os.getenv("STREAM_COALESCE_MAX_BYTES") or 512),
+        )
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """
+        The `time.monotonic()` time the held tokens must be sent by, None if nothing is held.
+        """
+        return self._started + self.window if self._pending else None
+
+    def add(self, event: Dict[str, Any]) -> List[str]:
+        """
+        Add an event, returns the lines that are ready to be sent.
+        """
+        if event["type"] not in TOKEN_TYPES or self.window <= 0:
+            return [*self.flush(), self._dumps(event)]
+
+        pending = self._pending
+        if pending and pending["type"] == event["type"] and pending["message_id"] == event["message_id"]:
+            pending["content"] += event["content"]
+            self._pending_bytes += len(event["content"].encode())
+            if self._pending_bytes >= self.max_bytes or time.monotonic() >= self.deadline:
+                return self.flush()
+            return []
+
+        lines = self.flush()
+        key = (event["type"], event["message_id"])
+        if key not in self._seen:
+            self._seen.add(key)
+            lines.append(self._dumps(event))
+        else:
+            self._pending = dict(event)
+            self._pending_bytes = len(event["content"].encode())
+            self._started = time.monotonic()
+        return lines
+
+    def flush(self) -> List[str]:
+        if not self._pending:
+            return []
+        line = self._dumps(self._pending)
+        self._pending = None
+        return [line]
+
+    @staticmethod
+    def _dumps(event: Dict[str, Any]) -> str:
+        return json.dumps(event) + "\n"
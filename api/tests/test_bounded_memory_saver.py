@@ -0,0 +1,34 @@
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+from memory.bounded_memory_saver import BoundedMemorySaver
+
+
+def config(thread_id: str):
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+
+def put(saver: BoundedMemorySaver, thread_id: str):
+    checkpoint = create_checkpoint(empty_checkpoint(), {}, 1)
+    saver.put(config(thread_id), checkpoint, {"source": "input", "step": 1, "writes": {}, "parents": {}}, {})
+
+
+def test_reading_unknown_threads_does_not_track_them():
+    saver = BoundedMemorySaver(max_threads=2)
+    put(saver, "a")
+    put(saver, "b")
+    for thread_id in ("c", "d", "e"):
+        assert saver.get_tuple(config(thread_id)) is None
+        assert list(saver.list(config(thread_id))) == []
+    assert list(saver._thread_bytes) == ["a", "b"]
+    assert saver.get_tuple(config("a")) is not None
+
+
+def test_reading_a_spilled_thread_evicts_another(tmp_path):
+    saver = BoundedMemorySaver(max_threads=2, spill_dir=str(tmp_path))
+    for thread_id in ("a", "b", "c"):
+        put(saver, thread_id)
+    assert list(saver._thread_bytes) == ["b", "c"]
+
+    assert saver.get_tuple(config("a")) is not None
+    assert list(saver._thread_bytes) == ["c", "a"]
+    assert set(saver.storage) == {"c", "a"}
+    assert len(list(tmp_path.iterdir())) == 1
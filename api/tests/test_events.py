@@ -0,0 +1,29 @@
+import asyncio
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.runnables import RunnableLambda
+from graph.utils import adrain_events, asend_event, send_event
+
+
+class EventRecorder(AsyncCallbackHandler):
+    def __init__(self):
+        self.events = []
+
+    async def on_custom_event(self, name, data, *, run_id, tags=None, metadata=None, **kwargs):
+        await asyncio.sleep(data["delay"])
+        self.events.append(name)
+
+
+def test_events_sent_from_sync_code_on_the_loop_are_delivered_before_the_drain_returns():
+    recorder = EventRecorder()
+
+    async def node(_):
+        # A sync helper called on the event loop, e.g. shared with the sync graph
+        send_event("scheduled", {"delay": 0.05})
+        await asend_event("awaited", {"delay": 0})
+
+    async def run():
+        await RunnableLambda(node).ainvoke(None, {"callbacks": [recorder]})
+        await adrain_events()
+        return list(recorder.events)
+
+    assert sorted(asyncio.run(run())) == ["awaited", "scheduled"]
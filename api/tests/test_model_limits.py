@@ -0,0 +1,45 @@
+import asyncio
+import threading
+import time
+import pytest
+from llm_utils.models import ModelLimits
+
+
+def test_sync_and_async_calls_share_the_concurrency_limit():
+    limits = ModelLimits("agent", max_concurrency=2)
+    lock = threading.Lock()
+    active = peak = 0
+
+    def call():
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+
+    def sync_call():
+        with limits.limit():
+            call()
+
+    async def async_call():
+        async with limits.alimit():
+            await asyncio.to_thread(call)
+
+    async def run():
+        await asyncio.gather(*[async_call() for _ in range(4)], *[asyncio.to_thread(sync_call) for _ in range(4)])
+
+    asyncio.run(run())
+    assert peak == 2
+
+
+def test_async_call_times_out():
+    limits = ModelLimits("observer", timeout=0.05)
+
+    async def run():
+        async with limits.alimit():
+            await asyncio.sleep(1)
+
+    with pytest.raises(TimeoutError, match="observer model did not respond within 0.05 seconds"):
+        asyncio.run(run())
@@ -0,0 +1,126 @@
+import asyncio
+from typing import Iterator, List, Sequence
+from uuid import uuid4
+import pytest
+from llm_utils.stop_sequences import StopSequenceFilter, remove_stop_sequences
+from streaming.callbacks import StreamCallbackHandler
+
+CASES = [
+    ["Thought: I know", " the answer\nObser", "vation:"],
+    ["Final Answer", ": 42", "\nObs", "erv", "ation: done"],
+    ["the calculat", "ion: Obs", "ervation: 4"],
+    ["Action: [ANSWER_", "SCHEMA]", " {}"],
+    ["User", ": hi", " AI:", " hello"],
+    ["no sequence here, just an Err", "or message"],
+    ["ends with a partial sequence Obs"],
+    ["ST", "OP", "STO", "P", "S", "T", "O", "P"],
+]
+
+
+def stream(tokens: Sequence[str], sequences: Sequence[str] = None) -> str:
+    stop_filter = StopSequenceFilter() if sequences is None else StopSequenceFilter(sequences)
+    return "".join(stop_filter.feed(token) for token in tokens) + stop_filter.flush()
+
+
+def splits(text: str) -> Iterator[List[str]]:
+    """
+    Every split of the text in two or three tokens.
+    """
+    for i in range(1, len(text)):
+        yield [text[:i], text[i:]]
+        for j in range(i + 1, len(text)):
+            yield [text[:i], text[i:j], text[j:]]
+
+
+def test_sequence_split_across_two_tokens():
+    assert stream(["the answer\nObser", "vation: 4"]) == "the answer\n 4"
+    assert stream(["Action: [ANSWER_", "SCHEMA] {}"]) == "Action:  {}"
+
+
+def test_sequence_split_across_three_tokens():
+    assert stream(["the answer\nObs", "erv", "ation: 4"]) == "the answer\n 4"
+    assert stream(["S", "TO", "P"]) == ""
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: "".join(case)[:30])
+def test_every_split_streams_like_the_whole_text(case: List[str]):
+    text = "".join(case)
+    expected = remove_stop_sequences(text)
+    for tokens in [case, *splits(text)]:
+        assert stream(tokens) == expected, tokens
+
+
+def test_partial_sequence_is_held_back_until_flushed():
+    stop_filter = StopSequenceFilter()
+    assert stop_filter.feed("the answer is 4. Obser") == "the answer is 4. "
+    assert stop_filter.flush() == "Obser"
+    # The filter starts over after a flush
+    assert stop_filter.feed("vation:") == "vation:"
+
+
+def test_overlapping_sequences():
+    # A partial sequence that turns into another one
+    assert stream(["ST", "STOP"]) == "ST"
+    assert stream(["Obs", "STOP"]) == "Obs"
+    # The sequence that ends first is removed, the other one is then incomplete
+    assert stream(["xab", "cdy"], sequences=("abc", "bcd")) == "xdy"
+    assert stream(["xab", "cdy"], sequences=("bc", "abcd")) == "xady"
+    assert stream(["Obs", "ervation:"], sequences=("Obs", "Observation:")) == "ervation:"
+    for tokens in splits("xabcdy"):
+        assert stream(tokens, sequences=("abc", "bcd")) == "xdy", tokens
+
+
+def run_handler(calls) -> List[dict]:
+    events = []
+    handler = StreamCallbackHandler(events.append)
+
+    async def replay():
+        for method, run_id, *args in calls:
+            if method == "start":
+                await handler.on_chat_model_start({}, [[]], run_id=run_id, tags=args[0])
+            elif method == "token":
+                await handler.on_llm_new_token(args[0], run_id=run_id)
+            else:
+                await handler.on_llm_end(None, run_id=run_id)
+
+    asyncio.run(replay())
+    return events
+
+
+def contents(events: List[dict], run_id) -> str:
+    return "".join(event["content"] for event in events if event["message_id"] == str(run_id))
+
+
+def test_handler_flushes_partial_sequence_on_llm_end():
+    run_id = uuid4()
+    events = run_handler(
+        [("start", run_id, ["agent"]), ("token", run_id, "the answer is 4"), ("token", run_id, ". Obs"), ("end", run_id)]
+    )
+    assert contents(events, run_id) == "the answer is 4. Obs"
+    assert events[-1] == {"type": "agent", "content": "Obs", "message_id": str(run_id)}
+
+
+def test_handler_filters_concurrent_runs_separately():
+    first, second, observer = uuid4(), uuid4(), uuid4()
+    events = run_handler(
+        [
+            ("start", first, ["agent"]),
+            ("start", second, ["agent"]),
+            ("start", observer, ["observer"]),
+            ("token", first, "Thought: a Obser"),
+            ("token", second, "Thought: b Obs"),
+            ("token", observer, "Obser"),
+            ("token", first, "vation: x"),
+            ("token", second, "cure"),
+            ("token", observer, "vation: kept"),
+            ("end", second),
+            ("token", first, " STO"),
+            ("end", first),
+            ("end", observer),
+        ]
+    )
+    assert contents(events, first) == "Thought: a  x STO"
+    assert contents(events, second) == "Thought: b Obscure"
+    # Only agent tokens are filtered
+    assert contents(events, observer) == "Observation: kept"
+    assert {event["type"] for event in events if event["message_id"] == str(observer)} == {"observer"}
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from langgraph.checkpoint.memory import MemorySaver
+from cache.write_behind_saver import WriteBehindSaver
+
+
+class SlowSaver(MemorySaver):
+    def __init__(self):
+        super().__init__()
+        self.written = []
+
+    def put_writes(self, config, writes, task_id):
+        time.sleep(0.2)
+        self.written.extend(value for _, value in writes)
+        super().put_writes(config, writes, task_id)
+
+
+def config(thread_id: str):
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": "", "checkpoint_id": "1"}}
+
+
+def test_aput_writes_waits_for_a_full_queue_without_blocking_the_loop():
+    saver = WriteBehindSaver(SlowSaver(), max_queue=1, batch_size=1)
+
+    async def run():
+        ticks = 0
+        writing = True
+
+        async def tick():
+            nonlocal ticks
+            while writing:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        started = time.monotonic()
+        await asyncio.gather(*[saver.aput_writes(config("t"), [("a", i)], f"task-{i}") for i in range(3)])
+        waited = time.monotonic() - started
+        await saver.aflush("t")
+        writing = False
+        await ticker
+        return ticks, waited
+
+    ticks, waited = asyncio.run(run())
+    # The third write waits for the first two to be written, the loop keeps ticking meanwhile
+    assert waited >= 0.3
+    assert ticks >= 20
+    assert saver.saver.written == [0, 1, 2]
+
+
+def test_cancelled_aput_writes_gives_its_slot_back():
+    saver = WriteBehindSaver(SlowSaver(), max_queue=1, batch_size=1)
+
+    async def run():
+        await saver.aput_writes(config("t"), [("a", 0)], "first")
+        waiting = asyncio.create_task(saver.aput_writes(config("t"), [("a", 1)], "second"))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        await saver.aflush("t")
+        # The slot the cancelled call waited for is free again once the first write is done
+        await asyncio.wait_for(saver.aput_writes(config("u"), [("a", 2)], "third"), 1)
+        await saver.aflush()
+
+    asyncio.run(run())
+    assert saver.saver.written == [0, 2]
@@ -1,6 +1,7 @@
 import os
 import re
 import json
+import threading
 import numexpr as ne
 from langchain_core.tools import tool
 from datetime import datetime
@@ -8,8 +9,9 @@ from langchain_community.tools import WikipediaQueryRun
 from langchain_community.utilities import WikipediaAPIWrapper
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_experimental.tools import PythonAstREPLTool
-from utils import format_tools
-from milvus.milvus import Milvus
+from typing import Dict, Optional
+from utils import Tools, format_tools
+from milvus.milvus import get_milvus
 from utils import is_rag_enabled
 
 """
@@ -17,15 +19,56 @@ This file contains the tools for the agent.
 
 To create a new tool, create a new function with the @tool decorator, and add a description.
 
-To add the tool to the agent, add it to the get_tools function.
+To add the tool to the agent, add it to the build_tools function.
 """
 
 ################################################################################
 
+_tools: Optional[Tools] = None
+_tools_lock = threading.Lock()
 
-def get_tools():
+
+def get_tools() -> Tools:
+    """
+    Get the shared tools for the agent.
+
+    The toolset is built once per process, call `refresh_tools` if RAG availability changes.
+    """
+    global _tools
+    if _tools is None:
+        with _tools_lock:
+            if _tools is None:
+                _tools = build_tools()
+    return _tools
+
+
+def refresh_tools() -> Tools:
+    """
+    Rebuild the shared tools for the agent, e.g. after the Milvus collection is created or removed.
+    """
+    global _tools
+    with _tools_lock:
+        _tools = build_tools()
+    return _tools
+
+
+def get_tool_timeouts() -> Dict[str, float]:
+    """
+    Get the tool timeouts in seconds from TOOL_TIMEOUTS, e.g. `default=60,search=20`.
+
+    `default` applies to the tools that are not listed, tools without a timeout can run for as long as they need.
     """
-    Get all the tools for the agent.
+    timeouts = {}
+    for timeout in os.getenv("TOOL_TIMEOUTS", "").split(","):
+        if "=" in timeout:
+            name, seconds = timeout.split("=", 1)
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+def build_tools() -> Tools:
+    """
+    Build all the tools for the agent.
 
     Update the tool list as needed.
     """
@@ -36,7 +79,7 @@ def get_tools():
         current_datetime,
         search,
     ]
-    
+
     if is_rag_enabled():
         tools.append(get_context)
 
@@ -128,7 +171,7 @@ def get_context(query: str):
     input = What is IBM?
     result = IBM is a multinational technology company headquartered in Armonk, New York.
     """
-    milvus = Milvus(cert_path="certs/cert.pem")
+    milvus = get_milvus()
 
     results = milvus.search(
         collection_name=os.getenv("MILVUS_COLLECTION"),
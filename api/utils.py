@@ -1,10 +1,10 @@
 from langchain_core.utils.function_calling import convert_to_openai_tool
-from typing import List
+from typing import Dict, List
 from langchain_core.tools import BaseTool
 import json
 from dataclasses import dataclass
 import os
-from milvus.milvus import Milvus
+from milvus.milvus import get_milvus
 
 
 @dataclass
@@ -12,6 +12,7 @@ class Tools:
     functions: List[BaseTool]
     json: str
     names: List[str]
+    by_name: Dict[str, BaseTool]
 
 
 def format_tools(tools: List[BaseTool]):
@@ -19,6 +20,7 @@ def format_tools(tools: List[BaseTool]):
         functions=tools,
         json=json.dumps([convert_to_openai_tool(tool)["function"] for tool in tools], indent=2),
         names=[tool.name for tool in tools],
+        by_name={tool.name: tool for tool in tools},
     )
 
 
@@ -26,7 +28,7 @@ def is_rag_enabled():
     if not os.getenv("MILVUS_HOST"):
         return False
     try:
-        milvus = Milvus(cert_path="certs/cert.pem")
+        milvus = get_milvus()
         if milvus.client.has_collection(collection_name=os.getenv("MILVUS_COLLECTION")):
             return True
         else:
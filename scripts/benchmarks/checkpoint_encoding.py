@@ -0,0 +1,118 @@
+"""
+Measure the bytes `MongoDBSaver` writes per ReAct run with full checkpoints versus delta encoded
+and compressed checkpoints.
+
+Runs a graph with the same state channels as the agent, where each node writes what the real node writes,
+so no LLM or tools are needed. Requires MONGO_HOST and MONGO_PORT, writes to a throwaway
+`checkpoints_benchmark` database.
+
+Usage: python3 scripts/benchmarks/checkpoint_encoding.py [--turns 5] [--iterations 4] [--tool-output-size 4000]
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.getcwd(), "api"))
+import argparse
+import time
+import bson
+from typing import Annotated, Union
+from typing_extensions import TypedDict
+from dotenv import load_dotenv
+from langgraph.graph import START, END, StateGraph
+from graph.reducers import add_clear, add_max_10
+from mongo.mongo_saver import MongoDBSaver, zstandard
+from schema.agent_outputs import Action, Finish, Observation, Error, ToolOutput
+from schema.message import Message
+
+load_dotenv()
+
+DB_NAME = "checkpoints_benchmark"
+
+
+class State(TypedDict):
+    input: str
+    output: str
+    messages: Annotated[list[Message], add_max_10]
+    steps: Annotated[list[Union[Action, ToolOutput, Observation, Finish, Error]], add_clear]
+    plan: str
+    iterations: int
+    scratchpad: Annotated[list[str], add_clear]
+
+
+def build_graph(saver: MongoDBSaver, iterations: int, tool_output_size: int):
+    def planner(state):
+        return {"plan": "1. Use `search`\n" * 5, "steps": None, "scratchpad": None, "output": None, "iterations": 0}
+
+    def agent(state):
+        if state["iterations"] >= iterations:
+            answer = "The answer. " * 40
+            return {
+                "steps": [Finish(output=answer, log=answer)],
+                "iterations": state["iterations"] + 1,
+                "messages": [Message(role="User", content=state["input"]), Message(role="Agent", content=answer)],
+                "output": answer,
+            }
+        text = 'Thought: I should search.\nAction: search\nAction Input: {"query": "something"}'
+        action = Action(thought="I should search.", action="search", action_input={"query": "x"}, scratchpad=text)
+        return {"steps": [action], "scratchpad": [text], "iterations": state["iterations"] + 1}
+
+    def tools(state):
+        return {"steps": [ToolOutput(tool_output="result " * (tool_output_size // 7))]}
+
+    def observer(state):
+        observation = "The search found something relevant. " * 5
+        return {"steps": [Observation(observation=observation)], "scratchpad": [f"Observation: < {observation} >\n\n"]}
+
+    graph = StateGraph(State)
+    for name, node in [("planner", planner), ("agent", agent), ("tools", tools), ("observer", observer)]:
+        graph.add_node(name, node)
+    graph.add_edge(START, "planner")
+    graph.add_edge("planner", "agent")
+    graph.add_conditional_edges("agent", lambda state: END if state["output"] else "tools", ["tools", END])
+    graph.add_edge("tools", "observer")
+    graph.add_edge("observer", "agent")
+    return graph.compile(checkpointer=saver)
+
+
+def stored_bytes(saver: MongoDBSaver) -> int:
+    return sum(
+        len(bson.encode(doc))
+        for collection in ("checkpoints", "checkpoint_writes", "checkpoint_blobs")
+        for doc in saver.sync_db[collection].find()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=4)
+    parser.add_argument("--tool-output-size", type=int, default=4000)
+    args = parser.parse_args()
+
+    if not os.getenv("MONGO_HOST") or not os.getenv("MONGO_PORT"):
+        sys.exit("MONGO_HOST and MONGO_PORT must be set to run this benchmark.")
+
+    modes = [("full", {}), ("delta", {"delta": True}), ("delta + zlib", {"delta": True, "compression": "zlib"})]
+    if zstandard is not None:
+        modes.append(("delta + zstd", {"delta": True, "compression": "zstd"}))
+
+    baseline = None
+    for name, options in modes:
+        saver = MongoDBSaver(host=os.getenv("MONGO_HOST"), port=int(os.getenv("MONGO_PORT")), db_name=DB_NAME, **options)
+        try:
+            graph = build_graph(saver, args.iterations, args.tool_output_size)
+            config = {"configurable": {"thread_id": "benchmark"}}
+            start = time.perf_counter()
+            for turn in range(args.turns):
+                graph.invoke({"input": f"Question {turn}?"}, config)
+            elapsed = time.perf_counter() - start
+            written = stored_bytes(saver)
+            baseline = baseline or written
+            print(f"{name:<13} {written / 1024:9.1f} KiB   {written / baseline:6.1%} of full   {elapsed:6.2f} s")
+        finally:
+            saver.sync_client.drop_database(DB_NAME)
+
+
+if __name__ == "__main__":
+    main()
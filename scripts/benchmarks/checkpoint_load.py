@@ -0,0 +1,83 @@
+"""
+Compare loading a checkpoint with the single aggregation used by `MongoDBSaver.get_tuple`
+against the previous two-query path (latest checkpoint, then its pending writes).
+
+Requires MONGO_HOST and MONGO_PORT, writes to a throwaway `checkpoints_benchmark` database.
+
+Usage: python3 scripts/benchmarks/checkpoint_load.py [--threads 50] [--checkpoints 20] [--reads 500]
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.getcwd(), "api"))
+import argparse
+import random
+import statistics
+import time
+from dotenv import load_dotenv
+from langgraph.checkpoint.base import empty_checkpoint, create_checkpoint
+from mongo.mongo_saver import MongoDBSaver
+
+load_dotenv()
+
+DB_NAME = "checkpoints_benchmark"
+
+
+def seed(saver: MongoDBSaver, threads: int, checkpoints: int):
+    for t in range(threads):
+        config = {"configurable": {"thread_id": f"thread-{t}", "checkpoint_ns": ""}}
+        checkpoint = empty_checkpoint()
+        for step in range(checkpoints):
+            checkpoint = create_checkpoint(checkpoint, None, step)
+            checkpoint["channel_values"] = {"input": "x" * 200, "plan": "y" * 500, "steps": ["z" * 300] * step}
+            config = saver.put(config, checkpoint, {"source": "loop", "step": step, "writes": {}}, {})
+            saver.put_writes(config, [("steps", ["w" * 200]), ("scratchpad", ["s" * 200])], f"task-{step}")
+
+
+def two_query_get_tuple(saver: MongoDBSaver, thread_id: str):
+    query = {"thread_id": thread_id, "checkpoint_ns": ""}
+    for doc in saver.sync_db["checkpoints"].find(query).sort("checkpoint_id", -1).limit(1):
+        saver.serde.loads_typed((doc["type"], doc["checkpoint"]))
+        writes = saver.sync_db["checkpoint_writes"].find({**query, "checkpoint_id": doc["checkpoint_id"]})
+        return [(w["task_id"], w["channel"], saver.serde.loads_typed((w["type"], w["value"]))) for w in writes]
+
+
+def aggregate_get_tuple(saver: MongoDBSaver, thread_id: str):
+    return saver.get_tuple({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}})
+
+
+def time_reads(fn, saver: MongoDBSaver, threads: int, reads: int):
+    timings = []
+    for _ in range(reads):
+        thread_id = f"thread-{random.randrange(threads)}"
+        start = time.perf_counter()
+        fn(saver, thread_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.mean(timings), timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--checkpoints", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=500)
+    args = parser.parse_args()
+
+    if not os.getenv("MONGO_HOST") or not os.getenv("MONGO_PORT"):
+        sys.exit("MONGO_HOST and MONGO_PORT must be set to run this benchmark.")
+
+    saver = MongoDBSaver(host=os.getenv("MONGO_HOST"), port=int(os.getenv("MONGO_PORT")), db_name=DB_NAME)
+    try:
+        seed(saver, args.threads, args.checkpoints)
+        for name, fn in [("two queries", two_query_get_tuple), ("aggregation", aggregate_get_tuple)]:
+            time_reads(fn, saver, args.threads, min(args.reads, 50))  # warm up
+            mean, p50, p95 = time_reads(fn, saver, args.threads, args.reads)
+            print(f"{name:<12} mean {mean:7.3f} ms   p50 {p50:7.3f} ms   p95 {p95:7.3f} ms")
+    finally:
+        saver.sync_client.drop_database(DB_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare checkpoint write and read latency of `MemorySaver`, `SQLiteSaver` and `MongoDBSaver`.
+
+SQLite writes to a temporary database file. Mongo is only included when MONGO_HOST and MONGO_PORT are set,
+and writes to a throwaway `checkpoints_benchmark` database.
+
+Usage: python3 scripts/benchmarks/checkpoint_savers.py [--threads 20] [--checkpoints 20]
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.getcwd(), "api"))
+import argparse
+import statistics
+import tempfile
+import time
+from dotenv import load_dotenv
+from langgraph.checkpoint.base import BaseCheckpointSaver, empty_checkpoint, create_checkpoint
+from langgraph.checkpoint.memory import MemorySaver
+from mongo.mongo_saver import MongoDBSaver
+from sqlite.sqlite_saver import SQLiteSaver
+
+load_dotenv()
+
+DB_NAME = "checkpoints_benchmark"
+
+
+def summary(timings: list[float]) -> str:
+    timings.sort()
+    return f"mean {statistics.mean(timings):7.3f} ms   p95 {timings[int(len(timings) * 0.95)]:7.3f} ms"
+
+
+def run(saver: BaseCheckpointSaver, threads: int, checkpoints: int):
+    writes, reads = [], []
+    for t in range(threads):
+        config = {"configurable": {"thread_id": f"thread-{t}", "checkpoint_ns": ""}}
+        checkpoint = empty_checkpoint()
+        for step in range(checkpoints):
+            checkpoint = create_checkpoint(checkpoint, None, step)
+            checkpoint["channel_values"] = {"input": "x" * 200, "plan": "y" * 500, "steps": ["z" * 300] * step}
+
+            start = time.perf_counter()
+            config = saver.put(config, checkpoint, {"source": "loop", "step": step, "writes": {}}, {})
+            saver.put_writes(config, [("steps", ["w" * 200]), ("scratchpad", ["s" * 200])], f"task-{step}")
+            writes.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            saved = saver.get_tuple({"configurable": {"thread_id": f"thread-{t}", "checkpoint_ns": ""}})
+            reads.append((time.perf_counter() - start) * 1000)
+            assert saved.checkpoint["id"] == checkpoint["id"] and len(saved.pending_writes) == 2
+    return writes, reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--checkpoints", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        savers = [("memory", MemorySaver()), ("sqlite", SQLiteSaver(os.path.join(directory, "checkpoints.db")))]
+        if os.getenv("MONGO_HOST") and os.getenv("MONGO_PORT"):
+            savers.append(
+                ("mongo", MongoDBSaver(host=os.getenv("MONGO_HOST"), port=int(os.getenv("MONGO_PORT")), db_name=DB_NAME))
+            )
+        else:
+            print("MONGO_HOST and MONGO_PORT not set, skipping MongoDB.")
+
+        for name, saver in savers:
+            try:
+                writes, reads = run(saver, args.threads, args.checkpoints)
+                print(f"{name:<7} put {summary(writes)}   get_tuple {summary(reads)}")
+            finally:
+                if isinstance(saver, MongoDBSaver):
+                    saver.sync_client.drop_database(DB_NAME)
+                elif isinstance(saver, SQLiteSaver):
+                    saver.close()
+
+
+if __name__ == "__main__":
+    main()
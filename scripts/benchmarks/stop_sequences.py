@@ -0,0 +1,73 @@
+"""
+Time the removal of stop sequences from streamed agent tokens: the `StopSequenceFilter` used now against
+the buffer-and-replace logic `/stream_agent` used before. The filter's correctness is covered by
+api/tests/test_stop_sequences.py.
+
+Usage: python3 scripts/benchmarks/stop_sequences.py [--size 1000000] [--runs 5]
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.getcwd(), "api"))
+import argparse
+import random
+import time
+from typing import List
+from llm_utils.stop_sequences import FILTER_SEQUENCES, STOP_SEQUENCES, StopSequenceFilter, remove_stop_sequences
+
+
+def filter_stream(tokens: List[str]) -> str:
+    stop_filter = StopSequenceFilter()
+    return "".join(stop_filter.feed(token) for token in tokens) + stop_filter.flush()
+
+
+def buffer_stream(tokens: List[str]) -> str:
+    """
+    The logic the stream used before: buffer tokens that are part of a stop sequence, replace sequences in the buffer.
+    """
+    sequences = [*STOP_SEQUENCES, *FILTER_SEQUENCES]
+    output, buffer = [], ""
+    for token in tokens:
+        buffer += token
+        if any(token in seq for seq in STOP_SEQUENCES):
+            continue
+        for seq in sequences:
+            buffer = buffer.replace(seq, "")
+        output.append(buffer)
+        buffer = ""
+    return "".join(output) + buffer
+
+
+def random_tokens(size: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    words = ["Thought:", "I", "should", "use", "the", "calculator", "Action:", "Observation:", "Obs", "User", "AI",
+             "STOP", "Error:", "answer", "[ANSWER_SCHEMA]", "{", "}", "\n", "42"]
+    text = " ".join(rng.choice(words) for _ in range(size // 6))
+    tokens, i = [], 0
+    while i < len(text):
+        length = rng.randint(1, 6)
+        tokens.append(text[i : i + length])
+        i += length
+    return tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000, help="Characters of streamed text per run")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    tokens = random_tokens(args.size)
+    size = sum(len(token) for token in tokens) / 1e6
+    expected = remove_stop_sequences("".join(tokens))
+    for name, stream in [("buffer", buffer_stream), ("filter", filter_stream)]:
+        start = time.process_time()
+        for _ in range(args.runs):
+            output = stream(tokens)
+        elapsed = (time.process_time() - start) / args.runs
+        print(f"{name:<8} {size / elapsed:6.2f} MB/s   {len(tokens)} tokens   output {'ok' if output == expected else 'differs'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Compare the CPU time and peak memory of streaming a run through `astream_events(version="v2")`, filtered
+like `/stream_agent` used to, against the `StreamCallbackHandler` it uses now.
+
+Runs a graph shaped like the agent (planner, agent, tools, observer) with fake chat models streaming fixed responses,
+so no API keys are needed. Both sources must produce the same events.
+
+Usage: python3 scripts/benchmarks/stream_events.py [--runs 20] [--response-size 2000]
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.getcwd(), "api"))
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing_extensions import TypedDict
+from typing import Any, AsyncIterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import tool
+from langgraph.graph import START, END, StateGraph
+from llm_utils.stop_sequences import STOP_SEQUENCES, remove_stop_sequences
+from streaming.callbacks import StreamCallbackHandler
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Streams a fixed response word by word from a native async `_astream`, like the provider chat models,
+    so the benchmark measures the event plumbing rather than the fake model.
+    """
+
+    response: str
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for word in self.response.split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class State(TypedDict):
+    input: str
+    output: str
+
+
+@tool
+def calculator(expression: str) -> str:
+    """Evaluate an arithmetic expression."""
+    return "4"
+
+
+def build_graph(response_size: int):
+    words = ("word " * (response_size // 5)).strip()
+
+    def runnable(tag: str):
+        llm = FakeStreamingChatModel(response=words)
+        return (
+            ChatPromptTemplate.from_template("{input}")
+            | llm.bind(stream=True).with_config({"tags": [tag]})
+            | StrOutputParser()
+        )
+
+    planner, agent, observer = runnable("planner"), runnable("agent"), runnable("observer")
+
+    async def planner_node(state):
+        return {"output": await planner.ainvoke({"input": state["input"]})}
+
+    async def agent_node(state):
+        return {"output": await agent.ainvoke({"input": state["input"]})}
+
+    async def tool_node(state):
+        return {"output": await calculator.ainvoke({"expression": "2 + 2"})}
+
+    async def observer_node(state):
+        return {"output": await observer.ainvoke({"input": state["input"]})}
+
+    graph = StateGraph(State)
+    for name, node in [("planner", planner_node), ("agent", agent_node), ("tools", tool_node), ("observer", observer_node)]:
+        graph.add_node(name, node)
+    graph.add_edge(START, "planner")
+    graph.add_edge("planner", "tools")
+    graph.add_edge("tools", "observer")
+    graph.add_edge("observer", "agent")
+    graph.add_edge("agent", END)
+    return graph.compile()
+
+
+async def astream_events_source(graph, events: list):
+    buffer = ""
+    async for event in graph.astream_events({"input": "question"}, version="v2"):
+        kind = event["event"]
+        tags = event.get("tags", [])
+        if kind == "on_chat_model_stream" and "agent" in tags:
+            content = event["data"]["chunk"].content
+            buffer += content
+            if all(content not in seq for seq in STOP_SEQUENCES):
+                events.append({"type": "agent", "content": remove_stop_sequences(buffer), "message_id": event["run_id"]})
+                buffer = ""
+        elif kind == "on_chat_model_stream" and ("observer" in tags or "planner" in tags):
+            tag = "observer" if "observer" in tags else "planner"
+            events.append({"type": tag, "content": event["data"]["chunk"].content, "message_id": event["run_id"]})
+        elif kind == "on_tool_start":
+            events.append({"type": "tool_start", "tool_id": event["run_id"], "tool_name": event["name"], "input": event["data"].get("input")})
+        elif kind == "on_tool_end":
+            events.append({"type": "tool_end", "tool_id": event["run_id"], "tool_name": event["name"], "output": event["data"].get("output")})
+
+
+async def callback_source(graph, events: list):
+    await graph.ainvoke({"input": "question"}, {"callbacks": [StreamCallbackHandler(events.append)]})
+
+
+def measure(source, graph, runs: int):
+    events = []
+    asyncio.run(source(graph, events))  # warm up
+    start = time.process_time()
+    for _ in range(runs):
+        events = []
+        asyncio.run(source(graph, events))
+    elapsed = (time.process_time() - start) * 1000 / runs
+
+    # Traced separately, tracing allocations slows everything down
+    tracemalloc.start()
+    asyncio.run(source(graph, []))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, events
+
+
+def without_ids(events: list):
+    return [{key: value for key, value in event.items() if key not in ("message_id", "tool_id")} for event in events]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--response-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    graph = build_graph(args.response_size)
+    results = {}
+    for name, source in [("astream_events", astream_events_source), ("callbacks", callback_source)]:
+        elapsed, peak, events = measure(source, graph, args.runs)
+        results[name] = events
+        print(f"{name:<15} {elapsed:8.2f} ms CPU/run   peak traced memory {peak / 1024:8.1f} KiB   {len(events)} events")
+
+    assert without_ids(results["astream_events"]) == without_ids(results["callbacks"]), "event sources differ"
+
+
+if __name__ == "__main__":
+    main()
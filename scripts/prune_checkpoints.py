@@ -0,0 +1,71 @@
+"""
+Apply checkpoint retention to the MongoDB checkpoint store, or the SQLite one if only SQLITE_CHECKPOINT_PATH is set.
+
+Usage:
+    python3 scripts/prune_checkpoints.py --thread-id <id> [--keep N]   prune a single thread
+    python3 scripts/prune_checkpoints.py --delete-thread <id>          delete a thread entirely
+    python3 scripts/prune_checkpoints.py [--keep N] [--ttl SECONDS]    compact every thread
+    python3 scripts/prune_checkpoints.py --backfill-updated-at         let older MongoDB checkpoints expire (once)
+
+--keep and --ttl default to CHECKPOINT_MAX_PER_THREAD and CHECKPOINT_THREAD_TTL_SECONDS.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.getcwd(), "api"))
+import argparse
+from dotenv import load_dotenv
+from graph.retention import RetentionPolicy
+from mongo.mongo_saver import MongoDBSaver
+from sqlite.sqlite_saver import SQLiteSaver
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--thread-id", help="prune only this thread")
+    parser.add_argument("--delete-thread", help="delete every checkpoint of this thread")
+    parser.add_argument("--keep", type=int, help="number of checkpoints to keep per thread")
+    parser.add_argument("--ttl", type=float, help="delete threads idle for more than this many seconds")
+    parser.add_argument(
+        "--backfill-updated-at", action="store_true", help="set updated_at on the MongoDB checkpoints without one"
+    )
+    args = parser.parse_args()
+
+    retention = RetentionPolicy.from_env()
+    if args.keep is not None:
+        retention.max_checkpoints = args.keep
+    if args.ttl is not None:
+        retention.thread_ttl = args.ttl
+
+    if os.getenv("MONGO_HOST") and os.getenv("MONGO_PORT"):
+        saver = MongoDBSaver(
+            host=os.getenv("MONGO_HOST"),
+            port=int(os.getenv("MONGO_PORT")),
+            db_name="checkpoints",
+            retention=retention,
+        )
+    elif os.getenv("SQLITE_CHECKPOINT_PATH"):
+        # The API resolves the path from the api directory
+        saver = SQLiteSaver(os.path.join("api", os.getenv("SQLITE_CHECKPOINT_PATH")), retention=retention)
+    else:
+        sys.exit("MONGO_HOST and MONGO_PORT, or SQLITE_CHECKPOINT_PATH, must be set to prune checkpoints.")
+
+    if args.backfill_updated_at:
+        if not isinstance(saver, MongoDBSaver):
+            sys.exit("--backfill-updated-at only applies to the MongoDB checkpoint store.")
+        print(f"Updated {saver.backfill_updated_at()} checkpoints")
+    elif args.delete_thread:
+        print(f"Deleted {saver.delete_thread(args.delete_thread)} checkpoints")
+    elif args.thread_id:
+        print(f"Deleted {saver.prune(args.thread_id)} checkpoints")
+    elif not retention.enabled:
+        sys.exit("No retention configured, pass --keep and/or --ttl.")
+    else:
+        print(saver.compact())
+
+
+if __name__ == "__main__":
+    main()